@@ -0,0 +1,143 @@
+import math
+
+import numpy
+
+###################################
+# SpriteAtlas class
+#
+#   Packs sprite images and their masks into one RGBA array (the mask goes
+#     in the alpha channel), so all the sprites in a tank live in a single
+#     block of memory instead of dozens of small images.
+#
+#   Sprites are added with add_sprite (which takes both the swimming right
+#     and swimming left pictures) or add, and placed by build().  Packing
+#     is by shelves: tallest first, left to right, starting a new shelf
+#     below when a row is full.
+#
+#   After build(), rects maps each image to its (left, top, right, bottom)
+#     sub-rectangle of pixels, and table holds the same rectangles as an
+#     (n, 4) array, in the order the images were added.  Images are looked
+#     up by identity, the same picture added twice is only stored once.
+#
+#   Adding sprites after build() means calling build() again, which packs
+#     everything from scratch.
+#
+#   Only ArrayCompositor blits from an atlas, so it's the only one that 
+#     makes one;  the other compositors would just be paying for a second
+#     copy of every sprite.
+###################################
+class SpriteAtlas():
+
+  def __init__(self):
+    self.images = []
+    self.masks = []
+    self.index = {}
+    self.rects = {}
+    self.table = numpy.zeros((0, 4), numpy.int32)
+    self.pixels = numpy.zeros((0, 0, 4), numpy.uint8)
+    self.opaque = numpy.zeros((0, 0, 1), bool)
+    self.built = True
+
+  ############################################
+  # add method
+  #   Adds one image with its mask, if it isn't in the atlas already.
+  #     Returns its number in table.
+  ###############################################
+  def add(self, image, mask):
+    number = self.index.get(id(image))
+    if number is not None and self.images[number] is image:
+      return number
+    number = len(self.images)
+    self.images.append(image)
+    self.masks.append(mask)
+    self.index[id(image)] = number
+    self.built = False
+    return number
+
+  ############################################
+  # add_sprite method
+  #   Adds both orientations of a Sprite (see sprite.py).
+  ###############################################
+  def add_sprite(self, sprite):
+    for direction in (1, -1):
+      image, mask = sprite.oriented(direction)
+      self.add(image, mask)
+
+  ############################################
+  # contains method
+  ###############################################
+  def contains(self, image):
+    number = self.index.get(id(image))
+    return number is not None and self.images[number] is image
+
+  ############################################
+  # pack method
+  #   Works out where each image goes.  Returns the (left, top) of each
+  #     one and the width and height of the whole atlas.
+  ###############################################
+  def pack(self):
+    sizes = [image.size for image in self.images]
+    if not sizes:
+      return [], 0, 0
+    # about square, but at least as wide as the widest sprite
+    area = sum(width * height for width, height in sizes)
+    atlas_width = max(max(width for width, height in sizes), int(math.ceil(math.sqrt(area))))
+
+    places = [None] * len(sizes)
+    x = 0
+    y = 0
+    shelf_height = 0
+    for number in sorted(range(len(sizes)), key=lambda number: -sizes[number][1]):
+      width, height = sizes[number]
+      if x + width > atlas_width:
+        y += shelf_height
+        x = 0
+        shelf_height = 0
+      places[number] = (x, y)
+      x += width
+      shelf_height = max(shelf_height, height)
+    return places, atlas_width, y + shelf_height
+
+  ############################################
+  # build method
+  #   Packs every image and mask into pixels, and fills in rects and table.
+  ###############################################
+  def build(self):
+    places, atlas_width, atlas_height = self.pack()
+    pixels = numpy.zeros((atlas_height, atlas_width, 4), numpy.uint8)
+    table = numpy.zeros((len(self.images), 4), numpy.int32)
+    rects = {}
+    for number, image in enumerate(self.images):
+      left, top = places[number]
+      width, height = image.size
+      rgb = image if image.mode == "RGB" else image.convert("RGB")
+      mask = self.masks[number]
+      if mask.mode != "L":
+        mask = mask.convert("L")
+      area = pixels[top:top + height, left:left + width]
+      area[:,:,:3] = numpy.frombuffer(rgb.tobytes(), numpy.uint8).reshape((height, width, 3))
+      area[:,:,3] = numpy.frombuffer(mask.tobytes(), numpy.uint8).reshape((height, width))
+      table[number] = (left, top, left + width, top + height)
+      rects[id(image)] = (left, top, left + width, top + height)
+
+    self.pixels = pixels
+    self.opaque = (pixels[:,:,3] == 255)[:,:,numpy.newaxis]
+    self.table = table
+    self.rects = rects
+    self.built = True
+
+  ############################################
+  # region method
+  #   Returns (pixels, mask, opaque) views of an image's part of the atlas.
+  ###############################################
+  def region(self, image):
+    left, top, right, bottom = self.rects[id(image)]
+    return (self.pixels[top:bottom, left:right], self.pixels[top:bottom, left:right, 3],
+            self.opaque[top:bottom, left:right])
+
+  ############################################
+  # nbytes method
+  #   How much memory the packed pixels take.
+  ###############################################
+  def nbytes(self):
+    return self.pixels.nbytes + self.opaque.nbytes
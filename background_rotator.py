@@ -0,0 +1,131 @@
+import sys
+import threading
+
+from PIL import Image
+
+from scheduler import monotonic
+from sprite import load_background
+
+###################################
+# BackgroundRotator class
+#
+#   Changes the tank's background every interval seconds, going round a
+#     list of files, with a short crossfade from one to the next.
+#
+#   Nothing slow happens in the frame loop:  as soon as a background goes
+#     up, a worker thread starts loading (decoding, resizing, converting)
+#     the next one and works out the whole crossfade, steps frames blended
+#     with Image.blend.  When it's time to change, tick just hands those
+#     frames out one by one.  If the worker isn't done yet, the background
+#     simply stays up a little longer.  A background that can't be loaded
+#     is written to log and skipped;  if none of the others can be, the
+#     worker tries them all again an interval later.
+#
+#   Tank calls tick once a frame (see Tank.rotate_backgrounds).  It returns
+#     the background to draw, the same image until something changes.
+#     swaps counts the backgrounds changed to.
+###################################
+class BackgroundRotator():
+
+  ############################################
+  # Init method
+  #   filenames are the backgrounds in order, the first is the one up now
+  #   size and mode are those of the tank's frames
+  #   interval is how long (seconds) each background stays up
+  #   fade is how long (seconds) the crossfade takes, in steps frames
+  #   log is where load errors go
+  #   timer can be swapped out for testing
+  ###############################################
+  def __init__(self, filenames, size, mode="RGB", interval=300, fade=2.0, steps=50, log=sys.stderr,
+               timer=monotonic):
+    self.filenames = list(filenames)
+    self.size = size
+    self.mode = mode
+    self.interval = interval
+    self.fade = fade
+    self.steps = steps
+    self.log = log
+    self.timer = timer
+    self.index = 0
+    self.current = None
+    self.next_change = None
+    self.prepared = None
+    self.worker = None
+    self.fading = None
+    self.fade_index = None
+    self.fade_start = None
+    self.swaps = 0
+
+  ############################################
+  # prepare method
+  #   Runs on the worker:  loads the background at index (or the first
+  #     one after it that loads) and blends the crossfade to it, then
+  #     leaves (its index, the frames) in prepared.
+  ###############################################
+  def prepare(self, current, index):
+    for attempt in range(len(self.filenames) - 1):
+      filename = self.filenames[index]
+      try:
+        background = load_background(filename, self.size)
+        if background.mode != self.mode:
+          background = background.convert(self.mode)
+        fade = [Image.blend(current, background, float(step) / self.steps) for step in range(1, self.steps)]
+      except Exception as error:
+        if self.log is not None:
+          self.log.write("skipping background %s: %s\n" % (filename, error))
+          self.log.flush()
+        index = (index + 1) % len(self.filenames)
+        continue
+      self.prepared = (index, fade + [background])
+      return
+
+  ############################################
+  # start_worker method
+  #   Starts preparing the next background, from the one now up.
+  ###############################################
+  def start_worker(self):
+    self.prepared = None
+    index = (self.index + 1) % len(self.filenames)
+    self.worker = threading.Thread(target=self.prepare, args=(self.current, index))
+    self.worker.daemon = True
+    self.worker.start()
+
+  ############################################
+  # tick method
+  #   Returns the background for this frame.  current is the tank's
+  #     background, only used the first time (as the first file's image).
+  ###############################################
+  def tick(self, current):
+    now = self.timer()
+    if self.current is None:
+      self.current = current
+      self.next_change = now + self.interval
+      if len(self.filenames) > 1:
+        self.start_worker()
+      return current
+
+    if self.fading is None:
+      if now < self.next_change:
+        return self.current
+      if self.prepared is None:
+        if not self.worker.is_alive():
+          # none of the others loaded, try them again later
+          self.next_change = now + self.interval
+          self.start_worker()
+        return self.current
+      self.fade_index, self.fading = self.prepared
+      self.prepared = None
+      self.fade_start = now
+
+    step = int((now - self.fade_start) / self.fade * len(self.fading)) if self.fade > 0 else len(self.fading)
+    if step < len(self.fading) - 1:
+      return self.fading[step]
+
+    # the crossfade is over, the new background is up
+    self.current = self.fading[-1]
+    self.fading = None
+    self.index = self.fade_index
+    self.next_change = now + self.interval
+    self.swaps += 1
+    self.start_worker()
+    return self.current
@@ -0,0 +1,349 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sys
+import time
+import traceback
+from timeit import default_timer
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+
+import PIL
+
+from clownfish_oo import Icon, Tank
+from display import NullBackend
+from compositor import COMPOSITORS
+from frame_stats import FrameProfiler
+from motion import NOMINAL_FPS
+
+###################################
+# Tank benchmark
+#
+#   Builds fish tank scenes from the bundled images and times Tank.show
+#     with the frames going to a NullBackend, so it runs without panels.
+#
+#   Every combination of icon count, panel layout and sprite scale is one
+#     scenario.  Each scenario runs in its own process so its peak memory
+#     is its own, and uses the same random seed so runs can be compared.
+#
+#   Examples:
+#     python bench_tank.py
+#     python bench_tank.py --icons 8,500 --layouts 5x3 --output before.json
+#     python bench_tank.py --output after.json --compare before.json
+#     python bench_tank.py --check-allocations
+###################################
+
+PANEL_SIZE = 32
+
+# the fish from clownfish_oo.py: filename, rtr, gtr, btr, x_size, y_size, timeout
+FISH = [
+  ("images/icons/clownfish.jpg",(0,10),(150,255),(0,10),40,25,2),
+  ("images/icons/clownfish.jpg",(0,10),(200,255),(0,10),32,20,5),
+  ("images/icons/clownfish.jpg",(0,10),(200,255),(0,10),16,10,0),
+  ("images/icons/dory.jpg",(0,10),(150,255),(0,10),28,20,20),
+  ("images/icons/seaTurtle.jpg",(0,10),(0,10),(150,255),80,50,30),
+  ("images/icons/seahorse_red.png",(0,100),(100,255),(0,100),24,32,15),
+  ("images/icons/parrotfish.jpg",(0,100),(100,255),(0,100),25,15,10),
+  ("images/icons/red-blood-parrot.jpg",(0,100),(100,255),(0,100),25,18,5),
+]
+
+BACKGROUND = "images/tanks/coral_tank.jpg"
+
+############################################
+# build_tank
+#   Makes a tank num_horiz x num_vert panels big with icon_count fish,
+#     cycling through FISH with every sprite scaled by scale, put together
+#     by the named compositor.  With population the fish are one 
+#     IconPopulation instead of separate Icons (same fish, same randoms).
+###############################################
+def build_tank(icon_count, num_horiz, num_vert, scale, seed, compositor="full", population=False,
+               display=None):
+  random.seed(seed)
+  if display is None:
+    display = NullBackend(PANEL_SIZE * num_horiz, PANEL_SIZE * num_vert)
+  tank = Tank(PANEL_SIZE, PANEL_SIZE, num_horiz, num_vert, display=display, compositor=compositor)
+  # every frame moves the fish the same amount, however long it took
+  tank.frame_time = 1.0 / NOMINAL_FPS
+  tank.set_background(BACKGROUND)
+  if population:
+    from population import IconPopulation
+    school = IconPopulation(tank.total_columns, tank.total_rows)
+  for index in range(icon_count):
+    filename, rtr, gtr, btr, x_size, y_size, timeout = FISH[index % len(FISH)]
+    x_size = max(1, int(round(x_size * scale)))
+    y_size = max(1, min(int(round(y_size * scale)), tank.total_rows))
+    if population:
+      icon = school.add(filename, rtr, gtr, btr, x_size, y_size, timeout)
+    else:
+      icon = Icon(filename, rtr, gtr, btr, x_size, y_size, timeout, tank.total_columns, tank.total_rows)
+    icon.setSlowdown(random.randint(0,4))
+    # spread the fish across the tank rather than all entering at once
+    icon.x = random.randint(-x_size, tank.total_columns)
+    if not population:
+      tank.add_icon(icon)
+  if population:
+    tank.add_population(school)
+  return tank
+
+############################################
+# percentile
+#   Returns the p'th percentile (0-100) of a sorted list.
+###############################################
+def percentile(ordered, p):
+  if not ordered:
+    return 0.0
+  index = int(round((len(ordered) - 1) * p / 100.0))
+  return ordered[index]
+
+############################################
+# run_scenario
+#   Times frames calls to Tank.show after warmup untimed ones.  Returns a
+#     dictionary of results.  With stages, a FrameProfiler is attached and
+#     its per-stage and per-icon summary is included.
+###############################################
+def run_scenario(scenario, frames, warmup, seed, stages=False):
+  tank = build_tank(scenario["icons"], scenario["num_horiz"], scenario["num_vert"], scenario["scale"], seed,
+                    scenario.get("compositor", "full"), scenario.get("population", False))
+
+  # Icon prints whenever a fish leaves the tank, keep that out of the report
+  stdout = sys.stdout
+  sys.stdout = open(os.devnull, "w")
+  try:
+    for frame in range(warmup):
+      tank.show()
+    if stages:
+      tank.profiler = FrameProfiler(window=frames)
+    times = []
+    started = default_timer()
+    for frame in range(frames):
+      frame_start = default_timer()
+      tank.show()
+      times.append(default_timer() - frame_start)
+    elapsed = default_timer() - started
+  finally:
+    sys.stdout.close()
+    sys.stdout = stdout
+
+  times.sort()
+  result = dict(scenario)
+  result.update({
+    "frames": frames,
+    "fps": frames / elapsed,
+    "mean_ms": 1000.0 * sum(times) / len(times),
+    "p50_ms": 1000.0 * percentile(times, 50),
+    "p99_ms": 1000.0 * percentile(times, 99),
+    "max_ms": 1000.0 * times[-1],
+    # ru_maxrss is kilobytes on Linux
+    "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+  })
+  if stages:
+    result["stages"] = tank.profiler.summary()
+  return result
+
+############################################
+# check_allocations
+#   Watches steady state frames for images being allocated, by counting
+#     every PIL image object made while they're drawn (crop, copy, convert,
+#     new, ...).  A frame that builds and throws away an image, or swaps
+#     one image for a new one (like screen.convert), is flagged.
+#   Frames where the clock text changed are skipped, the overlay is meant to
+#     re-render then, and so are frames where a fish left or came back (it
+#     prints and picks a new spot).  Returns (frames checked, list of 
+#     (frame, images made)).
+#   Compositors that are expected to make images (allocates, e.g. "dirty"
+#     crops the areas it redraws) are reported but don't fail the check.
+#     tests/test_allocations.py runs it for the others.
+###############################################
+def check_allocations(scenario, frames, warmup, seed):
+  from PIL import Image
+
+  tank = build_tank(scenario["icons"], scenario["num_horiz"], scenario["num_vert"], scenario["scale"], seed,
+                    scenario.get("compositor", "full"), scenario.get("population", False))
+  made = [0]
+  original = Image.Image.__init__
+  def counting_init(image, *args, **kwargs):
+    made[0] += 1
+    original(image, *args, **kwargs)
+
+  stdout = sys.stdout
+  sys.stdout = open(os.devnull, "w")
+  Image.Image.__init__ = counting_init
+  try:
+    for frame in range(warmup):
+      tank.show()
+
+    checked = 0
+    offenders = []
+    for frame in range(frames):
+      text = tank.overlay.key
+      on_screen = [icon.onScreen for icon in tank.icons]
+      made[0] = 0
+      tank.show()
+      if tank.overlay.key != text or on_screen != [icon.onScreen for icon in tank.icons]:
+        continue
+      checked += 1
+      if made[0]:
+        offenders.append((frame, made[0]))
+  finally:
+    Image.Image.__init__ = original
+    sys.stdout.close()
+    sys.stdout = stdout
+  return checked, offenders
+
+def _child(results, scenario, frames, warmup, seed, stages):
+  try:
+    results.put((True, run_scenario(scenario, frames, warmup, seed, stages)))
+  except Exception:
+    results.put((False, traceback.format_exc()))
+
+############################################
+# run_isolated
+#   Runs one scenario in a child process so memory use doesn't carry over
+#     from the scenarios before it.  Raises RuntimeError, with the child's
+#     traceback, if the scenario fails or the child dies.
+###############################################
+def run_isolated(scenario, frames, warmup, seed, stages=False):
+  results = multiprocessing.Queue()
+  child = multiprocessing.Process(target=_child, args=(results, scenario, frames, warmup, seed, stages))
+  child.start()
+  while True:
+    try:
+      ok, result = results.get(timeout=1)
+      break
+    except queue.Empty:
+      if not child.is_alive() and results.empty():
+        child.join()
+        raise RuntimeError("scenario %s died (exit code %s)" % (scenario_name(scenario), child.exitcode))
+  child.join()
+  if not ok:
+    raise RuntimeError("scenario %s failed:\n%s" % (scenario_name(scenario), result))
+  return result
+
+############################################
+# scenario_name
+###############################################
+def scenario_name(scenario):
+  name = "%dx%d/icons=%d/scale=%g" % (scenario["num_horiz"], scenario["num_vert"],
+                                      scenario["icons"], scenario["scale"])
+  if scenario.get("compositor", "full") != "full":
+    name += "/" + scenario["compositor"]
+  if scenario.get("population"):
+    name += "/population"
+  return name
+
+############################################
+# compare
+#   Prints how each scenario's fps and p99 moved against an earlier run.
+###############################################
+def compare(results, baseline_file):
+  with open(baseline_file) as baseline:
+    before = dict((entry["name"], entry) for entry in json.load(baseline)["scenarios"])
+  print("")
+  print("compared with %s" % baseline_file)
+  print("%-28s %10s %10s %10s %10s" % ("scenario", "fps", "change", "p99 ms", "change"))
+  for result in results:
+    old = before.get(result["name"])
+    if old is None:
+      print("%-28s %10.1f %10s %10.2f %10s" % (result["name"], result["fps"], "new", result["p99_ms"], "new"))
+      continue
+    print("%-28s %10.1f %+9.1f%% %10.2f %+9.1f%%" % (result["name"], result["fps"],
+          100.0 * (result["fps"] / old["fps"] - 1), result["p99_ms"],
+          100.0 * (result["p99_ms"] / old["p99_ms"] - 1)))
+
+def _int_list(text):
+  return [int(item) for item in text.split(",")]
+
+def _float_list(text):
+  return [float(item) for item in text.split(",")]
+
+def _positive_int(text):
+  value = int(text)
+  if value < 1:
+    raise argparse.ArgumentTypeError("must be at least 1: " + text)
+  return value
+
+def _layout_list(text):
+  layouts = []
+  for item in text.split(","):
+    num_horiz, num_vert = item.lower().split("x")
+    layouts.append((int(num_horiz), int(num_vert)))
+  return layouts
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark Tank.show without panels")
+  parser.add_argument("--icons", type=_int_list, default=[8, 32, 128, 500],
+                      help="comma separated icon counts (default 8,32,128,500)")
+  parser.add_argument("--layouts", type=_layout_list, default=[(5,3), (8,4), (10,6)],
+                      help="comma separated panel layouts, across x down (default 5x3,8x4,10x6)")
+  parser.add_argument("--scales", type=_float_list, default=[0.5, 1.0, 2.0],
+                      help="comma separated sprite scales (default 0.5,1,2)")
+  parser.add_argument("--compositor", choices=sorted(COMPOSITORS), default="full",
+                      help="how frames are put together (default full)")
+  parser.add_argument("--population", action="store_true",
+                      help="keep the fish in one IconPopulation instead of separate Icons")
+  parser.add_argument("--frames", type=_positive_int, default=300, help="timed frames per scenario")
+  parser.add_argument("--warmup", type=int, default=30, help="untimed frames before timing")
+  parser.add_argument("--seed", type=int, default=1234)
+  parser.add_argument("--output", default="bench_results.json", help="where to write the results")
+  parser.add_argument("--compare", help="an earlier results file to compare against")
+  parser.add_argument("--stages", action="store_true",
+                      help="also record per-stage and per-icon timings (adds a little overhead)")
+  parser.add_argument("--check-allocations", action="store_true",
+                      help="instead of timing, check steady frames allocate no images")
+  args = parser.parse_args(argv)
+
+  # the scene uses paths relative to the repo
+  os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+  if args.check_allocations:
+    failed = False
+    expected = getattr(COMPOSITORS[args.compositor], "allocates", False)
+    if expected:
+      print("(the %s compositor is expected to allocate, so this only reports)" % args.compositor)
+    for num_horiz, num_vert in args.layouts:
+      for scale in args.scales:
+        for icons in args.icons:
+          scenario = {"icons": icons, "num_horiz": num_horiz, "num_vert": num_vert, "scale": scale,
+                      "compositor": args.compositor, "population": args.population}
+          checked, offenders = check_allocations(scenario, args.frames, args.warmup, args.seed)
+          print("%-28s %4d of %4d frames allocated images" % (scenario_name(scenario), len(offenders), checked))
+          failed = failed or (bool(offenders) and not expected)
+    sys.exit(1 if failed else 0)
+
+  results = []
+  print("%-28s %10s %10s %10s %12s" % ("scenario", "fps", "p50 ms", "p99 ms", "peak rss kb"))
+  for num_horiz, num_vert in args.layouts:
+    for scale in args.scales:
+      for icons in args.icons:
+        scenario = {"icons": icons, "num_horiz": num_horiz, "num_vert": num_vert, "scale": scale,
+                    "compositor": args.compositor, "population": args.population}
+        result = run_isolated(scenario, args.frames, args.warmup, args.seed, args.stages)
+        result["name"] = scenario_name(scenario)
+        results.append(result)
+        print("%-28s %10.1f %10.2f %10.2f %12d" % (result["name"], result["fps"],
+              result["p50_ms"], result["p99_ms"], result["peak_rss_kb"]))
+
+  report = {
+    "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    "python": platform.python_version(),
+    "pillow": getattr(PIL, "__version__", getattr(PIL, "PILLOW_VERSION", "unknown")),
+    "machine": platform.machine(),
+    "seed": args.seed,
+    "scenarios": results,
+  }
+  with open(args.output, "w") as output:
+    json.dump(report, output, indent=2, sort_keys=True)
+  print("results written to %s" % args.output)
+
+  if args.compare:
+    compare(results, args.compare)
+
+if __name__ == "__main__":
+  main()
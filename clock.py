@@ -0,0 +1,70 @@
+import datetime
+import time
+
+from pytz import timezone
+
+# the strings every tank shows, by name
+DEFAULT_FORMATS = {
+  "time": "%I:%M:%S %p",
+  "day_of_week": "%A",
+  "date": "%B %d, %Y",
+}
+
+###################################
+# Clock class
+#
+#   Looks up the timezone once and formats the date/time strings once per
+#     wall clock second, instead of converting timezones every frame.
+#
+#   Call tick once a frame.  It returns True when a new second has started,
+#     which is the only time the strings (and anything drawn from them)
+#     need to change.
+###################################
+class Clock():
+
+  ############################################
+  # Init method
+  #   tz_name is a pytz timezone name, or None for the Pi's local time
+  #   formats maps a field name to its strftime format
+  ###############################################
+  def __init__(self, tz_name="US/Mountain", formats=None):
+    if tz_name is None:
+      self.tz = None
+    else:
+      self.tz = timezone(tz_name)
+    if formats is None:
+      formats = DEFAULT_FORMATS
+    self.formats = dict(formats)
+
+    self.second = None
+    self.now = None
+    self.seconds = 0
+    self.fields = {}
+
+  ############################################
+  # tick method
+  #   Updates our fields if the wall clock second has rolled over since
+  #     the last call.  Returns True when it has.
+  ###############################################
+  def tick(self, now=None):
+    if now is None:
+      now = time.time()
+    second = int(now)
+    if second == self.second:
+      return False
+    self.second = second
+
+    if self.tz is None:
+      self.now = datetime.datetime.fromtimestamp(second)
+    else:
+      self.now = datetime.datetime.fromtimestamp(second, self.tz)
+    self.seconds = self.now.second
+    self.fields = dict((name, self.now.strftime(fmt)) for name, fmt in self.formats.items())
+    return True
+
+  ############################################
+  # strings method
+  #   Returns a tuple of the named fields, in order.
+  ###############################################
+  def strings(self, *names):
+    return tuple(self.fields[name] for name in names)
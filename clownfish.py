@@ -1,13 +1,15 @@
-from time import sleep
-import datetime
-from pytz import timezone
 import random
 
 ###################################
 # Graphics imports, constants and structures
 ###################################
-from rgbmatrix import RGBMatrix, RGBMatrixOptions
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
+from clock import Clock
+from display import display_args, make_display
+from scheduler import FrameScheduler, monotonic
+from fonts import registry
+from motion import advance
+from sprite import Sprite, load_sprite, load_background
 
 # this is the size of ONE of our matrixes. 
 matrix_rows = 32
@@ -20,24 +22,20 @@ matrix_vertical = 3
 total_rows = matrix_rows * matrix_vertical
 total_columns = matrix_columns * matrix_horizontal
 
-options = RGBMatrixOptions()
-options.rows = matrix_rows 
-options.cols = matrix_columns 
-options.chain_length = matrix_horizontal
-options.parallel = matrix_vertical 
-#options.hardware_mapping = 'adafruit-hat-pwm'  # If you have an Adafruit HAT: 'adafruit-hat'
-#options.hardware_mapping = 'adafruit-hat'  # If you have an Adafruit HAT: 'adafruit-hat'
-options.hardware_mapping = 'regular' 
+#pick where frames go from the command line, the LED panels by default.
+#(on the panels frames are double buffered and swapped in on vsync)
+display_name, display_options = display_args()
+output = make_display(display_name, matrix_rows, matrix_columns, matrix_horizontal, matrix_vertical, 
+                      gpio_slowdown = 2, **display_options)
 
-options.gpio_slowdown = 2
-matrix = RGBMatrix(options = options)
+# formats our date/time text once a second in the chosen timezone
+clock = Clock("US/Mountain")
 
 ###################################
 # Main code 
 ###################################
-fnt = ImageFont.truetype("Arial_Bold.ttf",10)
-fnt2 = ImageFont.truetype("Arial_Bold.ttf",12)
-fnt3 = ImageFont.truetype("Arial_Bold.ttf",16)
+fnt = registry.get(10)
+fnt2 = registry.get(12)
 
 clownfish_width = 40
 clownfish_height = 25
@@ -45,55 +43,31 @@ clownfish_height = 25
 seaTurtle_width = 80
 seaTurtle_height = 50
 
-background = Image.open("images/tanks/reef_bgrd_dark_bottom.jpg")
-background.convert("RGBA")
-background = background.resize((total_columns,total_rows))
+background = load_background("images/tanks/reef_bgrd_dark_bottom.jpg", (total_columns,total_rows))
 
-clownfish = Image.open("images/icons/clownfish_left.jpg")
-clownfish = clownfish.convert("RGBA")
-clownfish = clownfish.resize((clownfish_width, clownfish_height))
-
-seaTurtle = Image.open("images/icons/seaTurtle.jpg")
-seaTurtle = seaTurtle.convert("RGBA")
-seaTurtle = seaTurtle.resize((seaTurtle_width, seaTurtle_height))
 seaTurtleStatus = False
-seaTurtleSpeed = 2
+# speeds are in pixels per second, so they don't depend on the frame rate.
+# the travel values keep the part of a pixel covered so far.
+seaTurtleSpeed = 20.0
+seaTurtleTravel = 0.0
+clownfishSpeed = 10.0
+clownfishTravel = 0.0
 
 
 #####################################################################
 # Transparency Masking
-# now that we have our image, we want to make a transparency mask.
-# start by looking at each pixel, and if it's green (0,255,0), make the mask
-# transparent (black).  Otherwise, make it fully opaque (white)
+# load each image along with its transparency mask.
+# any pixel that's green (0,255,0) is transparent (black) in the mask, 
+# everything else is fully opaque (white)
 #####################################################################
 
-clownfish_mask = Image.new("L", (clownfish_width,clownfish_height))
-clownfish_data = clownfish.getdata()
-clownfish_mask_data = []
-for item in clownfish_data:
-  print item
-  if item[0] <= 10 and item[1] >= 245 and item[2] <= 10:
-    clownfish_mask_data.append(0)
-    print "transparent"
-  else:
-    clownfish_mask_data.append(255)
-    print "opaque"
-clownfish_mask.putdata(clownfish_mask_data)
+clownfish, clownfish_mask = load_sprite("images/icons/clownfish_left.jpg", (clownfish_width, clownfish_height), (0,10), (245,255), (0,10))
+# keeps the flipped (right swimming) copy around so we only build it once
+clownfish_sprite = Sprite(clownfish, clownfish_mask)
 clownfish_x = total_columns
 clownfish_y = random.randint(0,total_rows-clownfish_height)
 
-seaTurtle_mask = Image.new("L", (seaTurtle_width,seaTurtle_height))
-seaTurtle_data = seaTurtle.getdata()
-seaTurtle_mask_data = []
-for item in seaTurtle_data:
-  print item
-  if item[0] <= 30 and item[1] <= 30 and item[2] >= 200:
-    seaTurtle_mask_data.append(0)
-    print "transparent"
-  else:
-    seaTurtle_mask_data.append(255)
-    print "opaque"
-seaTurtle_mask.putdata(seaTurtle_mask_data)
+seaTurtle, seaTurtle_mask = load_sprite("images/icons/seaTurtle.jpg", (seaTurtle_width, seaTurtle_height), (0,30), (0,30), (200,255))
 seaTurtle_x = total_columns
 seaTurtle_y = random.randint(0,total_rows-seaTurtle_height)
 
@@ -130,6 +104,12 @@ def clownfishDirectionChooser():
 screen = Image.new("RGBA",(total_columns,total_rows))
 clownfish_direction = clownfishDirectionChooser()
 
+# keeps the loop at 10 frames per second however long a frame takes to draw
+scheduler = FrameScheduler(10)
+# when we last moved things, each frame moves them by the time since then
+# (at most a quarter of a second, so a long stall doesn't send them flying)
+lastMove = monotonic()
+
 try:
   print("Press CTRL-C to stop")
   while True:
@@ -141,8 +121,7 @@ try:
     if clownfish_direction == -1:
       screen.paste(clownfish,(clownfish_x,clownfish_y),clownfish_mask)
     else:
-      clownfish_flip = clownfish.transpose(Image.FLIP_LEFT_RIGHT)
-      clownfish_flip_mask = clownfish_mask.transpose(Image.FLIP_LEFT_RIGHT)
+      clownfish_flip, clownfish_flip_mask = clownfish_sprite.variant("flip_lr")
       screen.paste(clownfish_flip,(clownfish_x,clownfish_y),clownfish_flip_mask)
 
     # paste in our seaTurtle (Layer 2)
@@ -155,16 +134,10 @@ try:
     #########################################
     # draw time information text on top
     #########################################
-    currentDT = datetime.datetime.now(timezone('UTC'))
-    currentDT_TZadjusted = currentDT.astimezone(timezone('US/Mountain'))
-    time_string = currentDT_TZadjusted.strftime("%I:%M:%S %p")
-    day_of_week = currentDT_TZadjusted.strftime("%A")
-    date_string = currentDT_TZadjusted.strftime("%B %d, %Y")
-    seconds = int(currentDT_TZadjusted.strftime("%S"))
+    new_second = clock.tick()
+    time_string, day_of_week, date_string = clock.strings("time", "day_of_week", "date")
     
-    time_size = fnt2.getsize(time_string)
-    day_of_week_size = fnt.getsize(day_of_week)
-    date_string_size = fnt.getsize(date_string)
+    day_of_week_size = registry.getsize(day_of_week, 10)
 
     edge_offset_x = 3
     edge_offset_y = 13
@@ -174,25 +147,32 @@ try:
     screen_draw.text((edge_offset_x,total_rows - edge_offset_y * 2),time_string, fill = (255,255,255), font = fnt2)
     screen_draw.text((edge_offset_x, total_rows - edge_offset_y),day_of_week, fill = (255,255,255), font = fnt)
     screen_draw.text((edge_offset_x + day_of_week_size[0] + text_spacing, total_rows - edge_offset_y),date_string, fill = (255,255,255), font = fnt)
-    matrix.SetImage(screen,0,0)
+    output.show(screen)
 
     #########################################
     # Start turtle from right to left at 30 seconds after the minute
     #########################################
-    if ((seconds % 30 == 0) & (seaTurtleStatus == False)): 
+    if (new_second and (clock.seconds % 30 == 0) and (seaTurtleStatus == False)): 
       print "Seed a turtle now!"
       seaTurtleStatus = True
       seaTurtle_x = -seaTurtle_width
       seaTurtle_y = random.randint(0,total_rows-seaTurtle_height)
 
+    # how long since we last moved
+    now = monotonic()
+    elapsed = min(now - lastMove, 0.25)
+    lastMove = now
+
     # update our seaTurtle location for next time
-    seaTurtle_x = seaTurtle_x + seaTurtleSpeed
+    pixels, seaTurtleTravel = advance(seaTurtleTravel, seaTurtleSpeed, elapsed)
+    seaTurtle_x = seaTurtle_x + pixels
 
     if seaTurtle_x > total_columns:
       seaTurtleStatus = False
 
     # update our clownfish location for next time
-    clownfish_x = clownfish_x + clownfish_direction
+    pixels, clownfishTravel = advance(clownfishTravel, clownfishSpeed, elapsed)
+    clownfish_x = clownfish_x + clownfish_direction * pixels
 
     # Moving left, start off screen to the right
     if clownfish_direction == -1:
@@ -212,7 +192,7 @@ try:
         else: 
           clownfish_x = -clownfish_width
         clownfish_y = random.randint(0,total_rows-clownfish_height)
-    sleep(.1)
+    scheduler.wait()
 
 except KeyboardInterrupt:
   exit(0)
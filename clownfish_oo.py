@@ -1,10 +1,21 @@
-import datetime
-from pytz import timezone
 import random
+import threading
 import time
-
-from rgbmatrix import RGBMatrix, RGBMatrixOptions
-from PIL import Image, ImageDraw, ImageFont
+from timeit import default_timer
+
+from background_rotator import BackgroundRotator
+from clock import Clock
+from compositor import make_compositor
+from display import MatrixBackend, display_args, make_display
+from scene_loader import SceneLoader
+from scheduler import FrameScheduler, monotonic
+from fonts import registry
+from frame_queue import FrameQueue
+from frame_stats import icon_key
+from governor import LoadGovernor
+from motion import NOMINAL_FPS, advance, slowdown_velocity
+from overlay import TextOverlay
+from sprite import load_background, shared_sprite
 
 ###################################
 # icon class 
@@ -14,7 +25,8 @@ from PIL import Image, ImageDraw, ImageFont
 #   On initialization, you specify an image file, which colors you want as 
 #     transparent, and the desired size (in pixels) of that icon.
 #
-#   The move method updates the image's x and y position.
+#   The move method updates the image's x and y position, at the icon's
+#     velocity in pixels per second (see motion.py).
 #  
 #   The show method pastes the icon into an image.   
 ###################################
@@ -29,8 +41,10 @@ class Icon():
   # y_size is the vertical size of the icon
   # timeout_seconds is the time an icons stays off screen before reseeding
   # total_columns and total_rows are the size of the whole matrix
+  # sprite is an already loaded Sprite for the image (see scene_loader.py)
   ###############################################
-  def __init__(self, filename, rtr, gtr, btr, x_size, y_size, timeout_seconds, total_columns, total_rows):
+  def __init__(self, filename, rtr, gtr, btr, x_size, y_size, timeout_seconds, total_columns, total_rows,
+               sprite=None):
   
     # top left corner of our image
     self.total_rows = total_rows
@@ -42,42 +56,38 @@ class Icon():
     self.x_size = x_size
     self.y_size = y_size
 
-    self.image = Image.open(filename)
-    self.image = self.image.convert("RGBA")
-    self.image = self.image.resize((x_size,y_size))
-
     self.filename = filename
     self.slowdown = 1
-    self.movecount = 1
+    self.velocity = slowdown_velocity(1)
+    self.travel = 0.0
     self.direction = 1
     self.timeout = timeout_seconds
     self.onScreen = True
 
-    # now that we have our image, we want to make a transparency mask.
-    # start by looking at each pixel, and if it's in our transparency 
-    # range, make the mask transparent (black).  Otherwise, make it 
-    # fully opaque (white)
-    self.mask = Image.new("L", (x_size,y_size))
-    icon_data = self.image.getdata()
-    mask_data = []
-    for item in icon_data:
-      # uncomment this line if you need to inspect pixels in your image
-      # print item
-
-      # is our pixel in range?  
-      if ((item[0] >= rtr[0] and item[0] <= rtr[1]) and \
-          (item[1] >= gtr[0] and item[1] <= gtr[1]) and \
-          (item[2] >= btr[0] and item[2] <= btr[1])):
-        mask_data.append(0)
-      else:
-        mask_data.append(255)
-      self.mask.putdata(mask_data)
+    # load our image along with its transparency mask.  Any pixel in our 
+    # transparency range is transparent (black) in the mask, everything else
+    # is fully opaque (white).  Warm starts come straight from the sprite cache,
+    # and icons made from the same file, size and ranges share one sprite.
+    if sprite is None:
+      sprite = shared_sprite(filename, (x_size,y_size), rtr, gtr, btr)
+    self.sprite = sprite
+    self.image, self.mask = self.sprite.image, self.sprite.mask
 
   ###############################################
   # setSlowdown method 
+  #   Moves one pixel every slowdown frames at the nominal frame rate (the
+  #     velocity is worked out from it).
   ###############################################
   def setSlowdown(self,slowdown):
     self.slowdown = slowdown
+    self.velocity = slowdown_velocity(slowdown)
+
+  ###############################################
+  # setVelocity method 
+  #   velocity is in pixels per second
+  ###############################################
+  def setVelocity(self,velocity):
+    self.velocity = velocity
   
   ###############################################
   # setDirection method 
@@ -87,23 +97,19 @@ class Icon():
   
   ###############################################
   # show method 
+  #   pastes the icon into the passed image, using the flipped copy of our
+  #     sprite when swimming left.  The flip is only built once.
   ###############################################
   def show(self,image):
-    if self.direction == 1:
-      image.paste(self.image,(self.x,self.y),self.mask)
-    else:
-      tempimage = self.image
-      tempimageMask = self.mask
-      tempimageFlip = tempimage.transpose(Image.FLIP_LEFT_RIGHT)
-      tempimageFlipMask = tempimageMask.transpose(Image.FLIP_LEFT_RIGHT)
-      image.paste(tempimageFlip,(self.x,self.y),tempimageFlipMask)
+    sprite_image, sprite_mask = self.sprite.oriented(self.direction)
+    image.paste(sprite_image,(self.x,self.y),sprite_mask)
 
   ###############################################
   # startTimeout method 
   ###############################################
   def startTimeout(self):
     self.timeoutStart = time.time()
-    print "timeout Started: "+str(self.filename) + " " +str(self.timeout) + "seconds"
+    print("timeout Started: "+str(self.filename) + " " +str(self.timeout) + "seconds")
 
   ###############################################
   # checkTimeout method 
@@ -117,17 +123,20 @@ class Icon():
   # move 
   #   Checks to see if icon is onScreen and if onScreen == False, it runs checkTimeout to
   #      see if it is time to reseed yet.
-  #   Updates our x and y position to the "next" spot.  
+  #   Updates our x and y position to the "next" spot, dt seconds on at our
+  #     velocity (one frame at the nominal rate by default).  
   #   If we go off the screen, we'll reset x, and pick a new
   #     random y.  
   ###############################################
-  def move(self):
+  def move(self, dt=None):
+    if dt is None:
+      dt = 1.0 / NOMINAL_FPS
     if self.onScreen == False:
       self.checkTimeout()
-      ## this else block allows different icons to move at a slower rate based on the .slowdown value
+      ## this else block lets slower icons wait until they've covered a whole pixel
     else:  
-      if self.movecount < self.slowdown:
-        self.movecount += 1
+      pixels, self.travel = advance(self.travel, self.velocity, dt)
+      if pixels == 0:
         return
       
       # if we're off the screen, reset direction and appropriate side, and pick a new y coordinate.
@@ -148,10 +157,8 @@ class Icon():
         else:
           self.y = random.randint(0,self.total_rows - self.y_size)
 
-      # move one pixel left or right depending on direction. 1 -> Right, -1 -> Left
-      self.x = self.x + self.direction
-      # increment movecount for slowing down movement if a value is set for .setSlowdown
-      self.movecount = 1
+      # move left or right depending on direction. 1 -> Right, -1 -> Left
+      self.x = self.x + self.direction * pixels
 
 ###################################
 #  Tank class
@@ -164,33 +171,90 @@ class Tank():
 
   ############################################
   # Init method 
+  #   clock is the Clock that formats our date/time text.  By default it 
+  #     shows US/Mountain time.
+  #   display is the backend frames are shown on (see display.py).  By 
+  #     default it's the LED panels.
+  #   compositor is how frames are put together (see compositor.py), 
+  #     "full" redraws everything each frame, "dirty" only what changed,
+  #     "array" does it all in numpy, "tiled" only redraws the panels that
+  #     changed.
+  #   compositor_options go to the compositor, e.g. {"workers": 4} for the
+  #     tiled one.
   ###############################################
-  def __init__(self, panel_rows, panel_columns, num_horiz_panels, num_vert_panels):
+  def __init__(self, panel_rows, panel_columns, num_horiz_panels, num_vert_panels, clock=None, display=None,
+               compositor="full", compositor_options=None):
  
     self.total_rows = panel_rows * num_vert_panels
     self.total_columns = panel_columns * num_horiz_panels
 
-    options = RGBMatrixOptions()
-    options.rows = matrix_rows 
-    options.cols = matrix_columns 
-    options.chain_length = num_horiz_panels
-    options.parallel = num_vert_panels 
-    options.hardware_mapping = 'regular' 
-    #options.gpio_slowdown = 2
-
-    self.matrix = RGBMatrix(options = options)
+    # where our frames go, the LED panels unless we're told otherwise
+    if display is None:
+      display = MatrixBackend(panel_rows, panel_columns, num_horiz_panels, num_vert_panels)
+    self.output = display
     self.background = None
     self.icons = []
-    self.screen = Image.new("RGBA",(self.total_columns,self.total_rows))
+    self.populations = []
+    self.fonts = registry
+    if clock is None:
+      clock = Clock("US/Mountain")
+    self.clock = clock
+    self.overlay = TextOverlay((self.total_columns,self.total_rows), self.fonts)
+    # an overlay that stays empty, for frames without text
+    self.no_text = TextOverlay((self.total_columns,self.total_rows), self.fonts)
+    # frames are built in one buffer in the display's own mode, the tiled
+    # compositor splits it into one tile per panel
+    options = {}
+    if compositor == "tiled":
+      options["tile"] = (panel_columns, panel_rows)
+    if compositor_options is not None:
+      options.update(compositor_options)
+    self.compositor = make_compositor(compositor, (self.total_columns,self.total_rows), self.output.mode,
+                                      **options)
+    self.screen = self.compositor.frame
+    # set to a FrameProfiler to time each stage of show
+    self.profiler = None
+    # changes the background on a schedule, see rotate_backgrounds
+    self.rotator = None
+    # icons move by the real time between frames, at most max_step seconds
+    # at once (so a long stall doesn't send them flying).  Set frame_time
+    # to move them by that much every frame instead, e.g. for benchmarks.
+    self.frame_time = None
+    self.max_step = 0.25
+    self.last_move = None
+    # the text is redrawn every text_interval seconds, and only the last
+    # icon_limit icons added are moved and drawn (None for all of them).
+    # A LoadGovernor turns these down when frames run late.
+    self.text_interval = 1
+    self.text_second = None
+    self.icon_limit = None
+    self.governor = None
 
   ############################################
   # set_background 
+  #   The background is converted to the display's mode here, once, so
+  #     each frame can copy it straight into the frame buffer.
+  #   loaded is the image from load_background if it has already been 
+  #     loaded elsewhere (see scene_loader.py).
   ############################################
-  def set_background(self, filename):
-    self.background = Image.open(filename)
-    self.background.convert("RGBA")
-    self.background = self.background.resize((self.total_columns,self.total_rows))
+  def set_background(self, filename, loaded=None):
+    background = loaded
+    if background is None:
+      background = load_background(filename, (self.total_columns,self.total_rows))
+    if background.mode != self.output.mode:
+      background = background.convert(self.output.mode)
+    self.background = background
    
+  ############################################
+  # rotate_backgrounds
+  #   Goes round filenames (the first should be the background that's up
+  #     now), changing to the next one every interval seconds with a fade
+  #     seconds crossfade.  See BackgroundRotator.
+  ############################################
+  def rotate_backgrounds(self, filenames, interval=300, fade=2.0):
+    self.rotator = BackgroundRotator(filenames, (self.total_columns,self.total_rows), self.output.mode,
+                                     interval, fade)
+
   ############################################
   # add_icon 
   ###############################################
@@ -198,127 +262,305 @@ class Tank():
     self.icons.append(icon)
 
   ############################################
-  # show
-  #   Displays the whole tank, and then moves any icon elements. 
+  # add_population
+  #   Adds every fish in an IconPopulation (see population.py), in the 
+  #     order they were added to it.  The whole population is moved in one 
+  #     step each frame rather than fish by fish.
   ###############################################
-  def show(self):
-    #restore background
-    self.screen.paste(self.background,(0,0))
-    
-    # move and paste in our icons 
-    for icon in self.icons:
-      icon.move()
-      icon.show(self.screen)
-
-    self.screen = self.screen.convert("RGB")
-    screen_draw = ImageDraw.Draw(self.screen)
+  def add_population(self, population):
+    self.populations.append(population)
+    for view in population.views:
+      self.add_icon(view)
 
-    ################################################
-    # Date and time formatting and postioning
-    ################################################
-    currentDT = datetime.datetime.now()
-    time_string = currentDT.strftime("%H:%M:%S")
-
-    #create various fonts
-    fnt = ImageFont.truetype("Arial_Bold.ttf",10)
-    fnt2 = ImageFont.truetype("Arial_Bold.ttf",12)
-    fnt3 = ImageFont.truetype("Arial_Bold.ttf",16)
-    fnt4 = ImageFont.truetype("Arial_Bold.ttf",19)
-    fnt5 = ImageFont.truetype("Arial_Bold.ttf",8)
-
-    #convert to selected timezone and format date/time info
-    currentDT = datetime.datetime.now(timezone('UTC'))
-    currentDT_TZadjusted = currentDT.astimezone(timezone('US/Mountain'))
-    time_string = currentDT_TZadjusted.strftime("%I:%M:%S %p")
-    day_of_week = currentDT_TZadjusted.strftime("%A")
-    date_string = currentDT_TZadjusted.strftime("%B %d, %Y")
-    seconds = int(currentDT_TZadjusted.strftime("%S"))
-    
+  ############################################
+  # layout_text
+  #   Positions the date/time strings and our special messages.  Returns 
+  #     the (xy, text, font_size, fill) items for the text overlay.
+  ###############################################
+  def layout_text(self, time_string, day_of_week, date_string):
     #determine size of the various text strings using .getsize so that we can center them
-    time_size = fnt2.getsize(time_string)
-    day_of_week_size = fnt.getsize(day_of_week)
-    date_string_size = fnt.getsize(date_string)
+    day_of_week_size = self.fonts.getsize(day_of_week, 10)
 
     edge_offset_x = 3
     edge_offset_y = 13
     text_spacing = 4
-    
-    #draw the text on screen
-    screen_draw.text((edge_offset_x,self.total_rows - edge_offset_y * 2),time_string, fill = (255,255,255), font = fnt2)
-    screen_draw.text((edge_offset_x, self.total_rows - edge_offset_y),day_of_week, fill = (255,255,255), font = fnt)
-    screen_draw.text((edge_offset_x + day_of_week_size[0] + text_spacing, self.total_rows - edge_offset_y),date_string, fill = (255,255,255), font = fnt)
 
     #special messages here
     specialMessage1 = ("Welcome to the")
     specialMessage2 = ("C.R.E.A.T.E. LAB")
     #specialMessage3 = ("The Center for Engineering Artistry and Technological Expression")
-    specialMessage1_size = fnt3.getsize(specialMessage1)
-    specialMessage2_size = fnt4.getsize(specialMessage2)
-    #specialMessage3_size = fnt5.getsize(specialMessage3)
+    specialMessage1_size = self.fonts.getsize(specialMessage1, 16)
+    specialMessage2_size = self.fonts.getsize(specialMessage2, 19)
+    #specialMessage3_size = self.fonts.getsize(specialMessage3, 8)
+
+    return [
+      ((edge_offset_x,self.total_rows - edge_offset_y * 2), time_string, 12, (255,255,255)),
+      ((edge_offset_x, self.total_rows - edge_offset_y), day_of_week, 10, (255,255,255)),
+      ((edge_offset_x + day_of_week_size[0] + text_spacing, self.total_rows - edge_offset_y), date_string, 10, (255,255,255)),
+      (((self.total_columns - specialMessage1_size[0]) /2,13), specialMessage1, 16, (255,200,255)),
+      (((self.total_columns - specialMessage2_size[0]) /2,30), specialMessage2, 19, (255,150,200)),
+      #(((self.total_columns - specialMessage3_size[0]) /2,50), specialMessage3, 8, (255,255,255)),
+    ]
 
-    screen_draw.text(((self.total_columns - specialMessage1_size[0]) /2,13),specialMessage1, fill = (255,200,255), font = fnt3)
-    screen_draw.text(((self.total_columns - specialMessage2_size[0]) /2,30),specialMessage2, fill = (255,150,200), font = fnt4)
-    #screen_draw.text(((self.total_columns - specialMessage3_size[0]) /2,50),specialMessage3, fill = (255,255,255), font = fnt5)
+  ############################################
+  # elapsed
+  #   How far (in seconds) to move the icons this frame.
+  ###############################################
+  def elapsed(self):
+    if self.frame_time is not None:
+      return self.frame_time
+    now = monotonic()
+    last = self.last_move
+    self.last_move = now
+    if last is None:
+      return 1.0 / NOMINAL_FPS
+    return min(now - last, self.max_step)
+
+  ############################################
+  # render
+  #   Moves any icon elements and composes the whole tank into self.screen,
+  #     without putting it on the display.  Returns the frame.
+  #   text=False leaves the date/time text off (e.g. for a recording that 
+  #     draws it live, see replay.py).
+  #   When self.profiler is set, each stage is timed (and each icon, by 
+  #     its position in the tank and filename);  the caller ends the frame.
+  ###############################################
+  def render(self, text=True):
+    profiler = self.profiler
+    if profiler is not None:
+      profiler.start()
+
+    # move our icons by however long it's been since the last frame, 
+    # populations move all their fish at once
+    dt = self.elapsed()
+    icons = self.icons
+    if self.icon_limit is not None:
+      icons = icons[-self.icon_limit:]
+    for index, icon in enumerate(icons, len(self.icons) - len(icons)):
+      if getattr(icon, "population", None) is not None:
+        continue
+      icon.move(dt)
+      if profiler is not None:
+        profiler.icon(icon_key(index, icon), "move")
+    if self.icon_limit is None:
+      for population in self.populations:
+        population.step(dt)
+    else:
+      # only step the fish that are still being drawn
+      kept = {}
+      for icon in icons:
+        population = getattr(icon, "population", None)
+        if population is not None:
+          kept.setdefault(population, []).append(icon.index)
+      for population in self.populations:
+        if population in kept:
+          population.step(dt, kept[population])
+    if profiler is not None and self.populations:
+      profiler.stage("move")
+
+    ################################################
+    # Date and time text
+    ################################################
+    #the clock only reformats once a second, and the text layer is only
+    #redrawn when that happens
+    overlay = self.no_text
+    if text:
+      if self.clock.tick() and (self.text_second is None or
+                                self.clock.second - self.text_second >= self.text_interval):
+        self.text_second = self.clock.second
+        self.overlay.update(self.clock.strings("time", "day_of_week", "date"), self.layout_text)
+      overlay = self.overlay
+    if profiler is not None:
+      profiler.stage("text")
+
+    # the next background (or crossfade step) when it's time for one
+    if self.rotator is not None and self.background is not None:
+      swaps = self.rotator.swaps
+      self.background = self.rotator.tick(self.background)
+      if profiler is not None:
+        profiler.stage("rotate")
+        if self.rotator.swaps != swaps:
+          profiler.count("background swaps")
+
+    # background, icons and text, back to front
+    self.screen = self.compositor.compose(self.background, icons, overlay, profiler)
+    return self.screen
+
+  ############################################
+  # show
+  #   Moves any icon elements, and then displays the whole tank.  The 
+  #     frame is composed straight into the display's memory when it has
+  #     some to offer, and a display that takes partial updates only gets
+  #     the tiles that changed (from the tiled compositor).
+  ###############################################
+  def show(self):
+    if hasattr(self.compositor, "retarget"):
+      target = self.output.target()
+      if target is not None:
+        self.compositor.retarget(*target)
+    self.render()
 
     #write all changes to the screen
-    self.matrix.SetImage(self.screen,0,0)
+    if self.output.supports_partial and hasattr(self.compositor, "changed"):
+      self.output.show_tiles(self.screen, self.compositor.tiles, self.compositor.changed)
+    else:
+      self.output.show(self.screen)
+    if self.profiler is not None:
+      self.profiler.stage("output")
+      self.profiler.end_frame()
+
+  ############################################
+  # run
+  #   Shows the tank over and over at fps frames per second until 
+  #     interrupted (or for the given number of frames).  policy is what
+  #     to do with late frames, "drop" or "catchup" (see FrameScheduler).
+  #   The scheduler is kept as self.scheduler so its stats can be read.
+  #
+  #   A LoadGovernor passed as governor sheds work (frame rate, text, 
+  #     icons) when frames take too long to make, see governor.py.
+  #
+  #   With queue_depth set, frames are rendered on a worker thread and this
+  #     thread only puts them on the display, so the next frame is composed
+  #     while the last one is being written out.  Up to queue_depth frames
+  #     wait in between, and queue_policy says what happens when the display
+  #     falls that far behind (see FrameQueue).  The queue is kept as 
+  #     self.frame_queue for its depth and latency stats.
+  ###############################################
+  def run(self, fps=50, policy="drop", frames=None, queue_depth=None, queue_policy="block", governor=None):
+    self.scheduler = FrameScheduler(fps, policy)
+    self.governor = governor
+    if governor is not None:
+      governor.start(self, self.scheduler)
+    if queue_depth is not None:
+      return self.run_threaded(frames, queue_depth, queue_policy)
+    try:
+      while frames is None or self.scheduler.frames < frames:
+        started = default_timer()
+        self.show()
+        if governor is not None:
+          governor.frame(default_timer() - started)
+        self.scheduler.wait()
+    finally:
+      self.output.close()
+
+  ############################################
+  # run_threaded
+  #   The queued version of run:  starts render_loop on a worker thread and
+  #     shows frames from the queue until it stops.
+  ###############################################
+  def run_threaded(self, frames, queue_depth, queue_policy):
+    frame = self.compositor.frame
+    self.frame_queue = FrameQueue(frame.size, frame.mode, queue_depth, queue_policy)
+    self.render_error = None
+    worker = threading.Thread(target=self.render_loop, args=(frames,))
+    worker.daemon = True
+    worker.start()
+    try:
+      while True:
+        queued = self.frame_queue.get()
+        if queued is None:
+          break
+        image, moved = queued
+        self.output.show(image)
+        self.frame_queue.done(image, moved)
+    finally:
+      self.frame_queue.close()
+      worker.join(1.0)
+      self.output.close()
+    if self.render_error is not None:
+      raise self.render_error
+
+  ############################################
+  # render_loop
+  #   The worker thread for run_threaded:  renders frames at the 
+  #     scheduler's pace, copies each into a buffer from the queue and 
+  #     queues it, stamped with the time the icons were moved.
+  ###############################################
+  def render_loop(self, frames):
+    profiler = self.profiler
+    try:
+      while frames is None or self.scheduler.frames < frames:
+        moved = default_timer()
+        self.render()
+        image = self.frame_queue.copy(self.screen)
+        if image is None:
+          break
+        if self.governor is not None:
+          self.governor.frame(default_timer() - moved)
+        kept = self.frame_queue.put(image, moved)
+        if profiler is not None:
+          if not kept:
+            profiler.count("frames dropped")
+          profiler.stage("queue")
+          profiler.end_frame()
+        self.scheduler.wait()
+    except Exception as error:
+      self.render_error = error
+    finally:
+      self.frame_queue.close()
 
 ###################################
 # Main code 
 ###################################
-matrix_rows = 32
-matrix_columns = 32
-num_horiz = 5
-num_vert = 3
-
-#create an instance of the Tank class and set it to a specific background image
-fish_tank = Tank(matrix_rows, matrix_columns, num_horiz, num_vert)
-tankChooser = random.randint(1,4)
-if tankChooser == 1:
-  fish_tank.set_background("images/tanks/reef_bgrd_dark_bottom.jpg")
-elif tankChooser == 2:
-  fish_tank.set_background("images/tanks/caribbean-coral-reef.jpg")
-elif tankChooser == 3:
-  fish_tank.set_background("images/tanks/coral_tank.jpg")
-else:
-  fish_tank.set_background("images/tanks/starfish_on_rock.jpg")
-
-#create as many instances of the Icon class as needed
-clownfish = Icon("images/icons/clownfish.jpg",(0,10),(150,255),(0,10),40,25,2,fish_tank.total_columns,fish_tank.total_rows)
-clownfish2 = Icon("images/icons/clownfish.jpg",(0,10),(200,255),(0,10),32,20,5,fish_tank.total_columns,fish_tank.total_rows)
-clownfish3 = Icon("images/icons/clownfish.jpg",(0,10),(200,255),(0,10),16,10,0,fish_tank.total_columns,fish_tank.total_rows)
-dory = Icon("images/icons/dory.jpg",(0,10),(150,255),(0,10),28,20,20,fish_tank.total_columns,fish_tank.total_rows)
-seaTurtle = Icon("images/icons/seaTurtle.jpg",(0,10),(0,10),(150,255),80,50,30,fish_tank.total_columns,fish_tank.total_rows)
-seahorse = Icon("images/icons/seahorse_red.png",(0,100),(100,255),(0,100),24,32,15,fish_tank.total_columns,fish_tank.total_rows)
-parrotfish = Icon("images/icons/parrotfish.jpg",(0,100),(100,255),(0,100),25,15,10,fish_tank.total_columns,fish_tank.total_rows)
-redBloodParrot = Icon("images/icons/red-blood-parrot.jpg",(0,100),(100,255),(0,100),25,18,5,fish_tank.total_columns,fish_tank.total_rows)
-
-
-#set the slowdown rate via the .setSlowdown method of the Icon class
-clownfish.setSlowdown(random.randint(0,2))
-clownfish2.setSlowdown(random.randint(0,4))
-clownfish3.setSlowdown(0)
-seahorse.setSlowdown(random.randint(0,4))
-seaTurtle.setSlowdown(random.randint(0,2))
-dory.setSlowdown(random.randint(0,3))
-
-#add each of the icon instances to the tank, the order these are added determines their relationship
-# in the taknk from back to front. Last one added is closer to the front of the tank
-fish_tank.add_icon(seahorse)
-fish_tank.add_icon(clownfish)
-fish_tank.add_icon(dory)
-fish_tank.add_icon(seaTurtle)
-fish_tank.add_icon(clownfish2)
-fish_tank.add_icon(parrotfish)
-fish_tank.add_icon(redBloodParrot)
-fish_tank.add_icon(clownfish3)
-
-try:
-  print("Press CTRL-C to stop")
-  while True:
-    fish_tank.show()
-    #the parameter below in time.sleep controls the overall rate of the whole tank and speed of
-    #   icons with no slowdown
-    time.sleep(.02)
-except KeyboardInterrupt:
-  exit(0)
+if __name__ == "__main__":
+  matrix_rows = 32
+  matrix_columns = 32
+  num_horiz = 5
+  num_vert = 3
+
+  #pick where frames go from the command line, the LED panels by default
+  display_name, display_options = display_args()
+  display = make_display(display_name, matrix_rows, matrix_columns, num_horiz, num_vert, **display_options)
+
+  #create an instance of the Tank class and set it to a specific background image
+  fish_tank = Tank(matrix_rows, matrix_columns, num_horiz, num_vert, display=display)
+  #the background and icon images are all loaded at once in the background
+  #   (see scene_loader.py), and the tank is set up when scene.load() is called
+  scene = SceneLoader(fish_tank, Icon)
+  #start on a random one of our backgrounds, then go round the rest
+  backgrounds = ["images/tanks/reef_bgrd_dark_bottom.jpg",
+                 "images/tanks/caribbean-coral-reef.jpg",
+                 "images/tanks/coral_tank.jpg",
+                 "images/tanks/starfish_on_rock.jpg"]
+  tankChooser = random.randint(0,3)
+  backgrounds = backgrounds[tankChooser:] + backgrounds[:tankChooser]
+  scene.set_background(backgrounds[0])
+
+  #add each of the icons to the scene, the order these are added determines their relationship
+  # in the taknk from back to front. Last one added is closer to the front of the tank
+  scene.add_icon("images/icons/seahorse_red.png",(0,100),(100,255),(0,100),24,32,15)
+  scene.add_icon("images/icons/clownfish.jpg",(0,10),(150,255),(0,10),40,25,2)
+  scene.add_icon("images/icons/dory.jpg",(0,10),(150,255),(0,10),28,20,20)
+  scene.add_icon("images/icons/seaTurtle.jpg",(0,10),(0,10),(150,255),80,50,30)
+  scene.add_icon("images/icons/clownfish.jpg",(0,10),(200,255),(0,10),32,20,5)
+  scene.add_icon("images/icons/parrotfish.jpg",(0,100),(100,255),(0,100),25,15,10)
+  scene.add_icon("images/icons/red-blood-parrot.jpg",(0,100),(100,255),(0,100),25,18,5)
+  scene.add_icon("images/icons/clownfish.jpg",(0,10),(200,255),(0,10),16,10,0)
+  seahorse, clownfish, dory, seaTurtle, clownfish2, parrotfish, redBloodParrot, clownfish3 = scene.load()
+
+  #change to the next background every 5 minutes, with a 2 second crossfade
+  fish_tank.rotate_backgrounds(backgrounds, interval=300, fade=2.0)
+
+  #set the slowdown rate via the .setSlowdown method of the Icon class
+  clownfish.setSlowdown(random.randint(0,2))
+  clownfish2.setSlowdown(random.randint(0,4))
+  clownfish3.setSlowdown(0)
+  seahorse.setSlowdown(random.randint(0,4))
+  seaTurtle.setSlowdown(random.randint(0,2))
+  dory.setSlowdown(random.randint(0,3))
+
+  #uncomment to print how long each stage of a frame takes, every minute and
+  #   whenever the tank gets kill -USR1
+  #from frame_stats import FrameProfiler
+  #fish_tank.profiler = FrameProfiler(interval=60)
+  #fish_tank.profiler.dump_on_signal()
+
+  try:
+    print("Press CTRL-C to stop")
+    #the fps below is the rate the tank aims for.  The governor lowers it
+    #   (and then draws less) if the Pi can't keep up, fish swim at the same
+    #   speed either way.  Add queue_depth=2 to compose the next frame
+    #   while the last one is still being written to the panels
+    fish_tank.run(fps=50, governor=LoadGovernor())
+  except KeyboardInterrupt:
+    exit(0)
@@ -0,0 +1,707 @@
+from PIL import Image
+
+from frame_stats import icon_key
+
+# numpy is only needed for the array compositor
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+###################################
+# compositors
+#
+#   A compositor builds each frame of the tank: background first, then the
+#     icons in the order they were added (back to front), then the text
+#     overlay on top.  Every compositor has the same method:
+#       compose(background, icons, overlay, profiler=None)
+#     which returns the finished frame.
+#
+#   The frame is allocated once, in the display's mode, and drawn into in
+#     place every time, so a steady frame doesn't allocate any new images.
+#     The background should already be in that mode (Tank converts it once
+#     in set_background) so restoring it is a straight copy.
+#
+#   FullCompositor redraws the whole frame every time.
+#   DirtyRectCompositor only redraws the parts of the frame that changed,
+#     and gives exactly the same pixels.
+#   ArrayCompositor redraws everything with numpy instead of PIL paste
+#     (also the same pixels).
+#   TiledCompositor only redraws the panel sized tiles that changed (the
+#     same pixels again), optionally on several threads.
+###################################
+
+############################################
+# clip_rect
+#   Clips a (left, top, right, bottom) rectangle to a width x height
+#     frame.  Returns None if nothing is left.
+###############################################
+def clip_rect(rect, width, height):
+  left = max(rect[0], 0)
+  top = max(rect[1], 0)
+  right = min(rect[2], width)
+  bottom = min(rect[3], height)
+  if left >= right or top >= bottom:
+    return None
+  return (left, top, right, bottom)
+
+############################################
+# intersect
+#   Returns the overlap of two rectangles, or None if they don't overlap.
+###############################################
+def intersect(first, second):
+  left = max(first[0], second[0])
+  top = max(first[1], second[1])
+  right = min(first[2], second[2])
+  bottom = min(first[3], second[3])
+  if left >= right or top >= bottom:
+    return None
+  return (left, top, right, bottom)
+
+############################################
+# visible_rect
+#   The part of a width x height sprite drawn at (x, y) that lands inside a
+#     frame_width x frame_height frame, as a (left, top, right, bottom) 
+#     rectangle of the sprite itself.  None if none of it does.
+#   Every compositor culls icons this would return None for (skips them 
+#     entirely) and counts the ones it would return less than the whole 
+#     sprite for as clipped.
+###############################################
+def visible_rect(x, y, width, height, frame_width, frame_height):
+  left = max(0, -x)
+  top = max(0, -y)
+  right = min(width, frame_width - x)
+  bottom = min(height, frame_height - y)
+  if left >= right or top >= bottom:
+    return None
+  return (left, top, right, bottom)
+
+############################################
+# count_culling
+#   Adds a frame's culled and clipped icon counts to the profiler.
+###############################################
+def count_culling(profiler, culled, clipped):
+  if profiler is not None:
+    profiler.count("icons culled", culled)
+    profiler.count("icons clipped", clipped)
+
+############################################
+# merge_rects
+#   Combines overlapping rectangles into their bounding boxes until none
+#     of them overlap, so no pixel is redrawn twice.
+#   Merging only ever grows the total area, so if it goes over limit we 
+#     stop early and return None.
+###############################################
+def merge_rects(rects, limit=None):
+  merged = []
+  area = 0
+  for rect in rects:
+    while True:
+      for index, other in enumerate(merged):
+        if intersect(rect, other) is not None:
+          rect = (min(rect[0], other[0]), min(rect[1], other[1]),
+                  max(rect[2], other[2]), max(rect[3], other[3]))
+          area -= (other[2] - other[0]) * (other[3] - other[1])
+          del merged[index]
+          break
+      else:
+        break
+    merged.append(rect)
+    area += (rect[2] - rect[0]) * (rect[3] - rect[1])
+    if limit is not None and area > limit:
+      return None
+  return merged
+
+############################################
+# paste_clipped
+#   Pastes the part of image (with its mask) at position that falls inside
+#     rect.  Returns False if none of it does.
+###############################################
+def paste_clipped(frame, image, mask, position, rect):
+  x, y = position
+  width, height = image.size
+  part = intersect((x, y, x + width, y + height), rect)
+  if part is None:
+    return False
+  if part == (x, y, x + width, y + height):
+    frame.paste(image, position, mask)
+    return True
+  source = (part[0] - x, part[1] - y, part[2] - x, part[3] - y)
+  frame.paste(image.crop(source), part[:2], mask.crop(source))
+  return True
+
+###################################
+# FullCompositor class
+#
+#   Pastes the background, every icon and the overlay on every frame.
+###################################
+class FullCompositor():
+
+  def __init__(self, size, mode="RGB"):
+    self.size = size
+    self.frame = Image.new(mode, size)
+    self.culled = 0
+    self.clipped = 0
+
+  def compose(self, background, icons, overlay, profiler=None):
+    #restore background
+    self.frame.paste(background,(0,0))
+    if profiler is not None:
+      profiler.stage("background")
+
+    # paste in the icons we can see.  PIL clips the partly visible ones 
+    # itself, cropping them first would only allocate a new image.
+    self.culled = 0
+    self.clipped = 0
+    frame_width, frame_height = self.size
+    for index, icon in enumerate(icons):
+      image, mask = icon.sprite.oriented(icon.direction)
+      x = icon.x
+      y = icon.y
+      width, height = image.size
+      if x >= frame_width or y >= frame_height or x + width <= 0 or y + height <= 0:
+        self.culled += 1
+      else:
+        if x < 0 or y < 0 or x + width > frame_width or y + height > frame_height:
+          self.clipped += 1
+        self.frame.paste(image, (x, y), mask)
+      if profiler is not None:
+        profiler.icon(icon_key(index, icon), "paste")
+    count_culling(profiler, self.culled, self.clipped)
+
+    overlay.show(self.frame)
+    if profiler is not None:
+      profiler.stage("text")
+    return self.frame
+
+###################################
+# DirtyRectCompositor class
+#
+#   Remembers where every icon was drawn last frame.  Only the areas that
+#     changed (an icon's old and new spots when it moves or turns, and the
+#     overlay when its text changes) get the background put back, and only
+#     the icons overlapping those areas are drawn again, clipped to them.
+#
+#   Slow icons only move once they've covered a whole pixel, so on most 
+#     frames only a few small areas are redrawn.  A new background redraws everything, and
+#     so does a busy frame where the changes cover more than full_redraw of
+#     the screen or are split into more than max_rects pieces, since one big
+#     paste is cheaper than many small ones.
+#
+#   Partly covered areas are drawn from small crops of the background and
+#     sprites, so unlike FullCompositor this one does allocate a little
+#     (allocates tells bench_tank.py --check-allocations to expect it).
+#
+#   dirty holds the rectangles redrawn on the last frame.
+###################################
+class DirtyRectCompositor():
+
+  allocates = True
+
+  def __init__(self, size, mode="RGB", full_redraw=0.5, max_rects=16):
+    self.size = size
+    self.full_redraw = full_redraw
+    self.max_rects = max_rects
+    self.frame = Image.new(mode, size)
+    self.background = None
+    self.drawn = {}
+    self.overlay_layer = None
+    self.overlay_box = None
+    self.dirty = []
+    self.culled = 0
+    self.clipped = 0
+
+  ############################################
+  # invalidate method
+  #   Makes the next frame a full redraw.
+  ###############################################
+  def invalidate(self):
+    self.background = None
+
+  ############################################
+  # rect_of
+  #   The on-screen rectangle of an icon drawn as state, or None.
+  ###############################################
+  def rect_of(self, state):
+    x, y, image, mask = state
+    return clip_rect((x, y, x + image.size[0], y + image.size[1]), self.size[0], self.size[1])
+
+  def compose(self, background, icons, overlay, profiler=None):
+    # where everything is this frame
+    drawn = {}
+    for icon in icons:
+      image, mask = icon.sprite.oriented(icon.direction)
+      drawn[icon] = (icon.x, icon.y, image, mask)
+    overlay_box = overlay.box()
+
+    full = (0, 0, self.size[0], self.size[1])
+    dirty = None
+    if background is self.background:
+      dirty = []
+      for icon, state in drawn.items():
+        before = self.drawn.get(icon)
+        if before is None:
+          dirty.append(self.rect_of(state))
+        elif before[0] != state[0] or before[1] != state[1] or before[2] is not state[2]:
+          dirty.append(self.rect_of(before))
+          dirty.append(self.rect_of(state))
+      for icon, before in self.drawn.items():
+        if icon not in drawn:
+          dirty.append(self.rect_of(before))
+      if overlay.layer is not self.overlay_layer or overlay_box != self.overlay_box:
+        dirty.append(self.overlay_box)
+        dirty.append(overlay_box)
+      dirty = merge_rects([rect for rect in dirty if rect is not None],
+                          self.full_redraw * self.size[0] * self.size[1])
+    if dirty is None or len(dirty) > self.max_rects:
+      dirty = [full]
+    # (on a frame where nothing changed, dirty is empty)
+    whole = dirty == [full]
+
+    #restore background where things changed
+    for rect in dirty:
+      if rect == full:
+        self.frame.paste(background, (0,0))
+      else:
+        self.frame.paste(background.crop(rect), rect[:2])
+    if profiler is not None:
+      profiler.stage("background")
+
+    # redraw the icons that overlap a changed area
+    self.culled = 0
+    self.clipped = 0
+    frame_width, frame_height = self.size
+    for index, icon in enumerate(icons):
+      x, y, image, mask = drawn[icon]
+      width, height = image.size
+      if x >= frame_width or y >= frame_height or x + width <= 0 or y + height <= 0:
+        self.culled += 1
+      else:
+        if x < 0 or y < 0 or x + width > frame_width or y + height > frame_height:
+          self.clipped += 1
+        if whole:
+          self.frame.paste(image, (x, y), mask)
+        else:
+          for rect in dirty:
+            paste_clipped(self.frame, image, mask, (x, y), rect)
+      if profiler is not None:
+        profiler.icon(icon_key(index, icon), "paste")
+    count_culling(profiler, self.culled, self.clipped)
+
+    # and the text on top
+    if whole:
+      overlay.show(self.frame)
+    elif overlay.layer is not None:
+      for rect in dirty:
+        paste_clipped(self.frame, overlay.layer, overlay.mask, overlay.position, rect)
+    if profiler is not None:
+      profiler.stage("text")
+      profiler.count("dirty rects", len(dirty))
+
+    self.background = background
+    self.drawn = drawn
+    self.overlay_layer = overlay.layer
+    self.overlay_box = overlay_box
+    self.dirty = dirty
+    return self.frame
+
+############################################
+# image_array
+#   Copies image into a new (rows, columns, 4) uint8 array of RGBX pixels, 
+#     the same channels PIL pastes from it.
+###############################################
+def image_array(image):
+  if image.mode != "RGB":
+    image = image.convert("RGB")
+  rgb = numpy.frombuffer(image.tobytes(), numpy.uint8)
+  pixels = numpy.empty((image.size[1], image.size[0], 4), numpy.uint8)
+  pixels[:,:,:3] = rgb.reshape((image.size[1], image.size[0], 3))
+  pixels[:,:,3] = 255
+  return pixels
+
+############################################
+# mask_values
+#   Copies a mask image into a new (rows, columns) uint8 array.
+###############################################
+def mask_values(mask):
+  if mask.mode != "L":
+    mask = mask.convert("L")
+  return numpy.frombuffer(mask.tobytes(), numpy.uint8).reshape((mask.size[1], mask.size[0])).copy()
+
+###################################
+# ArrayLayer class
+#
+#   An image and its mask as arrays, ready to be put into a frame.
+#
+#   Fully opaque mask pixels are kept as a boolean array and copied in one
+#     numpy call.  Sparse layers (like text, mostly empty space) instead keep
+#     the positions of their opaque pixels and copy just those.
+#   Partly transparent pixels (the edges of anti-aliased text) are kept as 
+#     a list of positions, with the image side of the blend worked out 
+#     ahead of time, and blended with the same rounding as PIL paste:  
+#       out = (image * mask + out * (255 - mask)) / 255
+###################################
+class ArrayLayer():
+
+  ############################################
+  # Init method
+  #   pixels is a (rows, columns, 4) uint8 array and values the matching 
+  #     (rows, columns) mask.  Either can be a view into a bigger array 
+  #     (like a SpriteAtlas), and so can solid, values == 255 with an extra
+  #     axis, if it's already been worked out.
+  ###############################################
+  def __init__(self, pixels, values, solid=None):
+    self.pixels = pixels
+    self.whole = (0, 0, pixels.shape[1], pixels.shape[0])
+    if solid is None:
+      solid = (values == 255)[:,:,numpy.newaxis]
+    self.solid = solid
+    self.sparse = numpy.count_nonzero(self.solid) * 4 < values.size
+    if self.sparse:
+      self.solid_rows, self.solid_columns = numpy.nonzero(values == 255)
+      self.solid_pixels = self.pixels[self.solid_rows, self.solid_columns]
+    self.rows, self.columns = numpy.nonzero((values > 0) & (values < 255))
+    weights = values[self.rows, self.columns].astype(numpy.uint16)[:,numpy.newaxis]
+    self.weighted = self.pixels[self.rows, self.columns] * weights + 128
+    self.inverse = 255 - weights
+
+  ############################################
+  # paste method
+  #   Puts the layer into frame (a rows x columns x 4 array) at (x, y), 
+  #     clipped to the frame.  source is the visible part of the layer 
+  #     (from visible_rect) if it's already been worked out.
+  ###############################################
+  def paste(self, frame, x, y, source=None):
+    rows, columns = self.pixels.shape[:2]
+    if source is None:
+      source = visible_rect(x, y, columns, rows, frame.shape[1], frame.shape[0])
+      if source is None:
+        return
+    left = x + source[0]
+    top = y + source[1]
+    right = x + source[2]
+    bottom = y + source[3]
+    clipped = source != (0, 0, columns, rows)
+    if self.sparse and not clipped:
+      frame[self.solid_rows + y, self.solid_columns + x] = self.solid_pixels
+    else:
+      numpy.copyto(frame[top:bottom, left:right],
+                   self.pixels[top - y:bottom - y, left - x:right - x],
+                   where=self.solid[top - y:bottom - y, left - x:right - x])
+    if not len(self.rows):
+      return
+
+    partial_rows = self.rows + y
+    partial_columns = self.columns + x
+    weighted = self.weighted
+    inverse = self.inverse
+    if clipped:
+      inside = ((partial_rows >= top) & (partial_rows < bottom) &
+                (partial_columns >= left) & (partial_columns < right))
+      partial_rows = partial_rows[inside]
+      partial_columns = partial_columns[inside]
+      weighted = weighted[inside]
+      inverse = inverse[inside]
+    total = frame[partial_rows, partial_columns] * inverse + weighted
+    total += total >> 8
+    frame[partial_rows, partial_columns] = total >> 8
+
+###################################
+# ArrayCompositor class
+#
+#   Does the whole frame in numpy.  The frame is one persistent (rows, 
+#     columns, 4) uint8 array; the background is turned into an array when
+#     it changes, and every sprite and mask is packed into one SpriteAtlas
+#     (see atlas.py) the first time it's seen.  The atlas is a second copy
+#     of the sprites' pixels, so it's only made (and atlas.py only loaded)
+#     for this compositor;  the PIL compositors paste the Sprites' own 
+#     images.  Each frame
+#     the background array is copied in, then each icon is clipped to the 
+#     frame with slices and copied through its mask, and the text goes on 
+#     top (see ArrayLayer).  The pixels match the PIL compositors exactly.
+#
+#   frame is an RGBX image that shares the array's memory, so nothing is 
+#     copied to hand it to the display.  MatrixBackend gives it straight to
+#     the panels; backends that want RGB convert it.  When the display 
+#     offers a target (see DisplayBackend.target) the frame is drawn there.
+#
+#   Needs numpy.
+###################################
+class ArrayCompositor():
+
+  def __init__(self, size, mode="RGB"):
+    if numpy is None:
+      raise ImportError("the array compositor needs numpy")
+    from atlas import SpriteAtlas
+    self.size = size
+    self.pixels = numpy.zeros((size[1], size[0], 4), numpy.uint8)
+    self.frame = Image.frombuffer("RGBX", size, self.pixels, "raw", "RGBX", 0, 1)
+    self.background = None
+    self.background_pixels = None
+    self.atlas = SpriteAtlas()
+    self.layers = {}
+    self.overlay_layer = None
+    self.overlay_pixels = None
+    self.culled = 0
+    self.clipped = 0
+
+  ############################################
+  # retarget method
+  #   Draws the following frames into pixels (with image a view of it) 
+  #     instead of our own array, e.g. a display's shared memory.  Every
+  #     frame is drawn in full, so it can change on every frame.
+  ###############################################
+  def retarget(self, pixels, image):
+    self.pixels = pixels
+    self.frame = image
+
+  ############################################
+  # prepare method
+  #   Puts every icon's sprite (both ways round) into the atlas, repacking 
+  #     it if any are new, and makes an ArrayLayer over each one's part of
+  #     the atlas.  compose calls this when it meets a sprite it hasn't got.
+  ###############################################
+  def prepare(self, icons):
+    for icon in icons:
+      self.atlas.add_sprite(icon.sprite)
+    if self.atlas.built:
+      return
+    self.atlas.build()
+    self.layers = {}
+    for image in self.atlas.images:
+      self.layers[id(image)] = (image, ArrayLayer(*self.atlas.region(image)))
+
+  def compose(self, background, icons, overlay, profiler=None):
+    #restore background
+    if background is not self.background:
+      self.background = background
+      self.background_pixels = image_array(background)
+    self.pixels[...] = self.background_pixels
+    if profiler is not None:
+      profiler.stage("background")
+
+    # paste in the icons we can see, straight from the atlas and clipped to
+    # just their visible part
+    self.culled = 0
+    self.clipped = 0
+    frame_width, frame_height = self.size
+    for index, icon in enumerate(icons):
+      image, mask = icon.sprite.oriented(icon.direction)
+      x = icon.x
+      y = icon.y
+      width, height = image.size
+      if x >= frame_width or y >= frame_height or x + width <= 0 or y + height <= 0:
+        self.culled += 1
+      else:
+        entry = self.layers.get(id(image))
+        if entry is None or entry[0] is not image:
+          self.prepare(icons)
+          entry = self.layers[id(image)]
+        if x < 0 or y < 0 or x + width > frame_width or y + height > frame_height:
+          self.clipped += 1
+          entry[1].paste(self.pixels, x, y)
+        else:
+          entry[1].paste(self.pixels, x, y, entry[1].whole)
+      if profiler is not None:
+        profiler.icon(icon_key(index, icon), "paste")
+    count_culling(profiler, self.culled, self.clipped)
+
+    # and the text on top
+    if overlay.layer is not self.overlay_layer:
+      self.overlay_layer = overlay.layer
+      self.overlay_pixels = None
+      if overlay.layer is not None:
+        self.overlay_pixels = ArrayLayer(image_array(overlay.layer), mask_values(overlay.mask))
+    if self.overlay_pixels is not None:
+      self.overlay_pixels.paste(self.pixels, overlay.position[0], overlay.position[1])
+    if profiler is not None:
+      profiler.stage("text")
+    return self.frame
+
+###################################
+# TiledCompositor class
+#
+#   Splits the frame into tiles, one per LED panel by default, and keeps 
+#     track of which tiles change.  Each frame only the tiles that an icon
+#     moved in or out of (or that the text changed in) are drawn again, so
+#     on a big wall the work goes with the number of changed tiles, not
+#     with the size of the wall.
+#
+#   Every tile is composed on its own, in its own small image:  the tile's
+#     piece of the background, the icons that overlap it (pasted at their
+#     offset from the tile's corner, PIL clips them to it) and the text, 
+#     and then copied into the frame.  No crops are made per frame.  Tiles
+#     don't share anything while they're drawn, so with workers set they
+#     are drawn on a pool of threads (PIL lets go of the GIL while it 
+#     pastes).
+#
+#   tiles holds (left, top, image) for every tile, and changed the numbers
+#     of the tiles drawn on the last frame, so a display that takes partial
+#     updates (see DisplayBackend.show_tiles) only needs those.  The frame 
+#     always holds the whole picture too.
+###################################
+class TiledCompositor():
+
+  ############################################
+  # Init method
+  #   tile is the (columns, rows) size of a tile, normally one panel
+  #   workers is how many threads draw tiles, None to draw them in turn
+  ###############################################
+  def __init__(self, size, mode="RGB", tile=(32, 32), workers=None):
+    self.size = size
+    self.frame = Image.new(mode, size)
+    self.tile_size = tile
+    self.columns = (size[0] + tile[0] - 1) // tile[0]
+    self.rows = (size[1] + tile[1] - 1) // tile[1]
+    self.rects = []
+    self.tiles = []
+    for row in range(self.rows):
+      for column in range(self.columns):
+        rect = (column * tile[0], row * tile[1],
+                min((column + 1) * tile[0], size[0]), min((row + 1) * tile[1], size[1]))
+        self.rects.append(rect)
+        self.tiles.append((rect[0], rect[1], Image.new(mode, (rect[2] - rect[0], rect[3] - rect[1]))))
+    self.background = None
+    self.background_tiles = None
+    self.drawn = {}
+    self.overlay_layer = None
+    self.overlay_box = None
+    self.changed = []
+    self.culled = 0
+    self.clipped = 0
+    self.pool = None
+    if workers is not None and workers > 1:
+      from multiprocessing.pool import ThreadPool
+      self.pool = ThreadPool(workers)
+
+  ############################################
+  # invalidate method
+  #   Makes the next frame draw every tile.
+  ###############################################
+  def invalidate(self):
+    self.background = None
+
+  ############################################
+  # tiles_in method
+  #   Returns the numbers of the tiles a (left, top, right, bottom) 
+  #     rectangle overlaps (it may hang off the frame).
+  ###############################################
+  def tiles_in(self, rect):
+    rect = clip_rect(rect, self.size[0], self.size[1])
+    if rect is None:
+      return []
+    first_column = rect[0] // self.tile_size[0]
+    last_column = (rect[2] - 1) // self.tile_size[0]
+    first_row = rect[1] // self.tile_size[1]
+    last_row = (rect[3] - 1) // self.tile_size[1]
+    return [row * self.columns + column
+            for row in range(first_row, last_row + 1)
+            for column in range(first_column, last_column + 1)]
+
+  ############################################
+  # draw_tile method
+  #   Composes one tile from its layers (a list of (image, mask, x, y) in
+  #     frame coordinates, back to front) and copies it into the frame.
+  #     Straight onto the image cores, there are a lot of these pastes.
+  ###############################################
+  def draw_tile(self, job):
+    number, layers = job
+    left, top, tile = self.tiles[number]
+    width, height = tile.size
+    tile.im.paste(self.background_tiles[number].im, (0, 0, width, height))
+    for image, mask, x, y in layers:
+      x -= left
+      y -= top
+      tile.im.paste(image.im, (x, y, x + image.size[0], y + image.size[1]), mask.im)
+    self.frame.im.paste(tile.im, (left, top, left + width, top + height))
+
+  def compose(self, background, icons, overlay, profiler=None):
+    # where everything is this frame (and which tiles it covers), and the
+    # tiles that changed
+    everything = background is not self.background
+    if everything:
+      self.background = background
+      self.background_tiles = [background.crop(rect) for rect in self.rects]
+    changed = set()
+    drawn = {}
+    self.culled = 0
+    self.clipped = 0
+    frame_width, frame_height = self.size
+    for icon in icons:
+      image, mask = icon.sprite.oriented(icon.direction)
+      x = icon.x
+      y = icon.y
+      width, height = image.size
+      before = self.drawn.get(icon)
+      if before is not None and before[0] == x and before[1] == y and before[2] is image:
+        covered = before[4]
+      else:
+        covered = self.tiles_in((x, y, x + width, y + height))
+        changed.update(covered)
+        if before is not None:
+          changed.update(before[4])
+      drawn[icon] = (x, y, image, mask, covered)
+      if not covered:
+        self.culled += 1
+      elif x < 0 or y < 0 or x + width > frame_width or y + height > frame_height:
+        self.clipped += 1
+    for icon, before in self.drawn.items():
+      if icon not in drawn:
+        changed.update(before[4])
+    overlay_box = overlay.box()
+    if overlay.layer is not self.overlay_layer or overlay_box != self.overlay_box:
+      for box in (self.overlay_box, overlay_box):
+        if box is not None:
+          changed.update(self.tiles_in(box))
+    if everything:
+      changed = range(len(self.tiles))
+    count_culling(profiler, self.culled, self.clipped)
+    if profiler is not None:
+      profiler.stage("track")
+
+    # what goes in each changed tile, back to front
+    layers = dict((number, []) for number in changed)
+    if layers:
+      for icon in icons:
+        x, y, image, mask, covered = drawn[icon]
+        for number in covered:
+          if number in layers:
+            layers[number].append((image, mask, x, y))
+      if overlay_box is not None:
+        for number in self.tiles_in(overlay_box):
+          if number in layers:
+            layers[number].append((overlay.layer, overlay.mask, overlay.position[0], overlay.position[1]))
+
+    jobs = sorted(layers.items())
+    if self.pool is not None and len(jobs) > 1:
+      self.pool.map(self.draw_tile, jobs)
+    else:
+      for job in jobs:
+        self.draw_tile(job)
+    if profiler is not None:
+      profiler.stage("tiles")
+      profiler.count("tiles drawn", len(jobs))
+
+    self.drawn = drawn
+    self.overlay_layer = overlay.layer
+    self.overlay_box = overlay_box
+    self.changed = [number for number, layer in jobs]
+    return self.frame
+
+# compositor names for Tank
+COMPOSITORS = {
+  "full": FullCompositor,
+  "dirty": DirtyRectCompositor,
+  "array": ArrayCompositor,
+  "tiled": TiledCompositor,
+}
+
+############################################
+# make_compositor
+#   Creates the named compositor for a frame of the given size and mode.
+#     Any options go to the compositor (e.g. tile and workers for "tiled").
+###############################################
+def make_compositor(name, size, mode="RGB", **options):
+  if name not in COMPOSITORS:
+    raise ValueError("unknown compositor: " + str(name))
+  return COMPOSITORS[name](size, mode, **options)
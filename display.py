@@ -0,0 +1,415 @@
+import argparse
+import os
+import threading
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+
+from PIL import Image
+
+###################################
+# SimulatedCanvas class
+#
+#   Stands in for an rgbmatrix FrameCanvas.  The pixels end up in an RGB
+#     image so they can be inspected without a panel attached.
+###################################
+class SimulatedCanvas():
+
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.image = Image.new("RGB", (width, height))
+
+  def SetImage(self, image, offset_x=0, offset_y=0):
+    if image.mode != self.image.mode:
+      image = image.convert(self.image.mode)
+    self.image.paste(image, (offset_x, offset_y))
+
+  def SetPixelsPillow(self, offset_x, offset_y, width, height, image):
+    self.SetImage(image.crop((0, 0, width, height)), offset_x, offset_y)
+
+  def Clear(self):
+    self.image.paste((0,0,0), (0, 0, self.width, self.height))
+
+###################################
+# SimulatedMatrix class
+#
+#   Stands in for rgbmatrix.RGBMatrix, following its off-screen canvas
+#     model: frames are drawn into a canvas from CreateFrameCanvas and
+#     SwapOnVSync makes that canvas the visible one, handing back the old
+#     one to draw the next frame into.
+#
+#   front is the canvas currently "on the panels" and swaps counts frames.
+###################################
+class SimulatedMatrix():
+
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.front = SimulatedCanvas(width, height)
+    self.swaps = 0
+
+  def CreateFrameCanvas(self):
+    return SimulatedCanvas(self.width, self.height)
+
+  def SwapOnVSync(self, canvas):
+    previous = self.front
+    self.front = canvas
+    self.swaps += 1
+    return previous
+
+  def SetImage(self, image, offset_x=0, offset_y=0):
+    self.front.SetImage(image, offset_x, offset_y)
+
+############################################
+# set_canvas
+#   Copies image into canvas.  SetImage only takes RGB images, but RGBX 
+#     ones (like ArrayCompositor's frame) are laid out the same way in 
+#     memory, so those go through SetPixelsPillow without a conversion.
+###############################################
+def set_canvas(canvas, image):
+  if image.mode == "RGBX":
+    canvas.SetPixelsPillow(0, 0, image.size[0], image.size[1], image)
+  else:
+    canvas.SetImage(image, 0, 0)
+
+###################################
+# DoubleBufferedMatrix class
+#
+#   Writes frames into an off-screen canvas and swaps it onto the panels in
+#     one step on the next vsync, so the panels never show a half written
+#     frame.
+#
+#   With threaded=True the swap (which waits for vsync) happens on its own
+#     thread.  show then only copies the frame into a free canvas and
+#     returns, so the render loop doesn't stall behind the panel refresh.
+###################################
+class DoubleBufferedMatrix():
+
+  ############################################
+  # Init method
+  #   matrix is an RGBMatrix, or a SimulatedMatrix for testing
+  ###############################################
+  def __init__(self, matrix, threaded=False):
+    self.matrix = matrix
+    self.threaded = threaded
+    self.frames = 0
+    # for show_tiles, the tiles each canvas has missed (None for all)
+    self.stale = {}
+
+    if not threaded:
+      self.canvas = matrix.CreateFrameCanvas()
+      return
+
+    # two spare canvases: one being written while the other waits for vsync
+    self.free = queue.Queue()
+    self.free.put(matrix.CreateFrameCanvas())
+    self.free.put(matrix.CreateFrameCanvas())
+    self.ready = queue.Queue(maxsize=1)
+    self.thread = threading.Thread(target=self.swap_loop)
+    self.thread.daemon = True
+    self.thread.start()
+
+  ############################################
+  # show method
+  #   Copies image into a back buffer and swaps it onto the panels.
+  ###############################################
+  def show(self, image):
+    canvas = self.canvas if not self.threaded else self.free.get()
+    set_canvas(canvas, image)
+    # every other canvas is now behind by the whole frame
+    for other in self.stale:
+      self.stale[other] = None
+    self.stale[canvas] = set()
+    self.swap(canvas)
+
+  ############################################
+  # show_tiles method
+  #   Like show, but only copies the tiles that are out of date in the back
+  #     buffer:  the ones that changed this frame, plus the ones that 
+  #     changed while that canvas was away being shown.  tiles and changed
+  #     are as in TiledCompositor.  A canvas we haven't written whole yet
+  #     gets the whole image.
+  ###############################################
+  def show_tiles(self, image, tiles, changed):
+    canvas = self.canvas if not self.threaded else self.free.get()
+    for other, stale in self.stale.items():
+      if stale is not None:
+        stale.update(changed)
+    stale = self.stale.get(canvas)
+    if stale is None:
+      set_canvas(canvas, image)
+    else:
+      for number in sorted(stale):
+        left, top, tile = tiles[number]
+        canvas.SetPixelsPillow(left, top, tile.size[0], tile.size[1], tile)
+    self.stale[canvas] = set()
+    self.swap(canvas)
+
+  ############################################
+  # swap method
+  #   Puts a written canvas on the panels (or hands it to the swap thread).
+  ###############################################
+  def swap(self, canvas):
+    if self.threaded:
+      self.ready.put(canvas)
+    else:
+      self.canvas = self.matrix.SwapOnVSync(canvas)
+    self.frames += 1
+
+  ############################################
+  # swap_loop
+  #   Runs on the swap thread, putting each finished canvas on the panels
+  #     and recycling the one it replaces.
+  ###############################################
+  def swap_loop(self):
+    while True:
+      canvas = self.ready.get()
+      if canvas is None:
+        return
+      self.free.put(self.matrix.SwapOnVSync(canvas))
+
+  ############################################
+  # close method
+  #   Stops the swap thread once the last frame is up.
+  ###############################################
+  def close(self):
+    if self.threaded and self.thread.is_alive():
+      self.ready.put(None)
+      self.thread.join()
+
+###################################
+# display backends
+#
+#   A Tank hands every finished frame to a display backend.  All backends 
+#     have the same two methods:
+#       show(image) - put the frame on the display
+#       close()     - finish up when the tank stops
+#     and count the frames they've been given in frames.  mode is the image
+#     mode they want frames in, so the tank can build frames that way.
+#   A backend can also offer the memory the next frame is going to end up 
+#     in through target(), so a compositor can draw straight into it.
+#   One with supports_partial set can take just the tiles of a frame that
+#     changed, through show_tiles(image, tiles, changed) (see 
+#     TiledCompositor);  the others get the whole frame from it.
+#
+#   MatrixBackend drives the real panels.  The others let the tank run 
+#     without the Pi hardware, for profiling, testing and benchmarks:
+#       NullBackend       - throws frames away, for measuring throughput
+#       MemoryBackend     - keeps the last few frames in a ring buffer
+#       FrameDumpBackend  - writes frames out as PNG files or raw RGB
+###################################
+class DisplayBackend():
+
+  mode = "RGB"
+  supports_partial = False
+
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.frames = 0
+
+  def show(self, image):
+    self.frames += 1
+
+  ############################################
+  # target method
+  #   Returns (array, image) views of where the next frame should be 
+  #     drawn, or None to have it passed to show as usual.
+  ###############################################
+  def target(self):
+    return None
+
+  ############################################
+  # show_tiles method
+  #   Puts a frame on the display when only the tiles numbered in changed
+  #     (of tiles, a list of (left, top, image)) differ from the last one.
+  ###############################################
+  def show_tiles(self, image, tiles, changed):
+    self.show(image)
+
+  def close(self):
+    pass
+
+###################################
+# MatrixBackend class
+#
+#   The LED panels.  rgbmatrix is only imported here, so the other backends
+#     work on machines without it.  Frames are double buffered (see 
+#     DoubleBufferedMatrix).
+###################################
+class MatrixBackend(DisplayBackend):
+
+  ############################################
+  # Init method
+  #   panel_rows and panel_columns are the size of ONE panel, and the panels
+  #     are chained num_horiz_panels across and num_vert_panels down.
+  #   matrix can be passed in (e.g. a SimulatedMatrix) instead of creating
+  #     an RGBMatrix.
+  ###############################################
+  def __init__(self, panel_rows, panel_columns, num_horiz_panels, num_vert_panels,
+               hardware_mapping='regular', gpio_slowdown=None, threaded=False, matrix=None):
+    DisplayBackend.__init__(self, panel_columns * num_horiz_panels, panel_rows * num_vert_panels)
+    if matrix is None:
+      from rgbmatrix import RGBMatrix, RGBMatrixOptions
+
+      options = RGBMatrixOptions()
+      options.rows = panel_rows
+      options.cols = panel_columns
+      options.chain_length = num_horiz_panels
+      options.parallel = num_vert_panels
+      options.hardware_mapping = hardware_mapping
+      if gpio_slowdown is not None:
+        options.gpio_slowdown = gpio_slowdown
+      matrix = RGBMatrix(options = options)
+
+    self.matrix = matrix
+    self.output = DoubleBufferedMatrix(matrix, threaded)
+
+  supports_partial = True
+
+  def show(self, image):
+    self.output.show(image)
+    self.frames += 1
+
+  def show_tiles(self, image, tiles, changed):
+    self.output.show_tiles(image, tiles, changed)
+    self.frames += 1
+
+  def close(self):
+    self.output.close()
+
+###################################
+# NullBackend class
+#
+#   Discards every frame.  Running a tank into this measures how fast we 
+#     can render with no display cost at all.
+###################################
+class NullBackend(DisplayBackend):
+  pass
+
+###################################
+# MemoryBackend class
+#
+#   Keeps copies of the last capacity frames in a ring of preallocated 
+#     images, so nothing is allocated per frame.
+###################################
+class MemoryBackend(DisplayBackend):
+
+  def __init__(self, width, height, capacity=16):
+    DisplayBackend.__init__(self, width, height)
+    self.ring = [Image.new("RGB", (width, height)) for i in range(capacity)]
+
+  def show(self, image):
+    slot = self.ring[self.frames % len(self.ring)]
+    if image.mode != slot.mode:
+      image = image.convert(slot.mode)
+    slot.paste(image, (0,0))
+    self.frames += 1
+
+  ############################################
+  # recent method
+  #   Returns the frames we still hold, oldest first.
+  ###############################################
+  def recent(self):
+    held = min(self.frames, len(self.ring))
+    return [self.ring[index % len(self.ring)] for index in range(self.frames - held, self.frames)]
+
+  ############################################
+  # latest method
+  #   Returns the most recent frame, or None before the first one.
+  ###############################################
+  def latest(self):
+    if self.frames == 0:
+      return None
+    return self.ring[(self.frames - 1) % len(self.ring)]
+
+###################################
+# FrameDumpBackend class
+#
+#   Writes frames into directory, either as numbered PNG files 
+#     (frame_000000.png, ...) or with fmt="raw" as one frames.rgb file of 
+#     back to back width x height RGB frames.
+###################################
+class FrameDumpBackend(DisplayBackend):
+
+  def __init__(self, width, height, directory="frames", fmt="png"):
+    DisplayBackend.__init__(self, width, height)
+    if fmt not in ("png", "raw"):
+      raise ValueError("unknown frame format: " + str(fmt))
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+    self.directory = directory
+    self.fmt = fmt
+    self.raw = None
+    if fmt == "raw":
+      self.raw = open(os.path.join(directory, "frames.rgb"), "wb")
+
+  def show(self, image):
+    if image.mode != "RGB":
+      image = image.convert("RGB")
+    if self.raw is not None:
+      self.raw.write(image.tobytes())
+    else:
+      image.save(os.path.join(self.directory, "frame_%06d.png" % self.frames))
+    self.frames += 1
+
+  def close(self):
+    if self.raw is not None:
+      self.raw.close()
+      self.raw = None
+
+# backend names for make_display and the --display option
+DISPLAYS = ("matrix", "null", "memory", "png", "raw")
+
+############################################
+# make_display
+#   Creates the named backend for a wall of panels.  gpio_slowdown only 
+#     applies to the panels, any other options are passed on to the backend
+#     (e.g. capacity for "memory", directory for "png" and "raw").
+#   With pipeline=True the backend runs in its own process, fed through 
+#     shared memory (see pipeline.py).
+###############################################
+def make_display(name, panel_rows, panel_columns, num_horiz_panels, num_vert_panels, gpio_slowdown=None,
+                 pipeline=False, **options):
+  if pipeline:
+    from pipeline import PipelineBackend
+    return PipelineBackend(panel_rows, panel_columns, num_horiz_panels, num_vert_panels,
+                           display=name, gpio_slowdown=gpio_slowdown, **options)
+  width = panel_columns * num_horiz_panels
+  height = panel_rows * num_vert_panels
+  if name == "matrix":
+    return MatrixBackend(panel_rows, panel_columns, num_horiz_panels, num_vert_panels,
+                         gpio_slowdown=gpio_slowdown, **options)
+  if name == "null":
+    return NullBackend(width, height)
+  if name == "memory":
+    return MemoryBackend(width, height, **options)
+  if name in ("png", "raw"):
+    return FrameDumpBackend(width, height, fmt=name, **options)
+  raise ValueError("unknown display: " + str(name))
+
+############################################
+# display_args
+#   Reads the --display, --output and --pipeline command line options so 
+#     any script can run headless, e.g. 
+#       python clownfish_oo.py --display png --output frames
+#   Returns (name, options) for make_display.
+###############################################
+def display_args(argv=None):
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--display", choices=DISPLAYS, default="matrix",
+                      help="where frames go (default: the LED panels)")
+  parser.add_argument("--output", default="frames",
+                      help="directory for the png and raw displays")
+  parser.add_argument("--pipeline", action="store_true",
+                      help="drive the display from a second process")
+  args = parser.parse_args(argv)
+  options = {}
+  if args.display in ("png", "raw"):
+    options["directory"] = args.output
+  if args.pipeline:
+    options["pipeline"] = True
+  return args.display, options
@@ -0,0 +1,60 @@
+from PIL import ImageFont
+
+###################################
+# font registry
+#
+#   Opening a TrueType file is slow on the Pi, so every (face, size) pair is
+#     loaded once and the same font object is handed out after that.
+#
+#   getsize remembers the size of strings it has already measured.  The
+#     clock strings change every second, so the remembered sizes are
+#     dropped once there are more than max_sizes of them.
+###################################
+
+DEFAULT_FACE = "Arial_Bold.ttf"
+
+class FontRegistry():
+
+  ############################################
+  # Init method
+  #   max_sizes is how many measured strings we hold on to
+  ###############################################
+  def __init__(self, max_sizes=512):
+    self.fonts = {}
+    self.sizes = {}
+    self.max_sizes = max_sizes
+
+  ############################################
+  # get method
+  #   Returns the shared font for face at the given point size.
+  ###############################################
+  def get(self, size, face=DEFAULT_FACE):
+    key = (face, size)
+    font = self.fonts.get(key)
+    if font is None:
+      font = ImageFont.truetype(face, size)
+      self.fonts[key] = font
+    return font
+
+  ############################################
+  # getsize method
+  #   Returns the (width, height) of text drawn in face at the given size.
+  ###############################################
+  def getsize(self, text, size, face=DEFAULT_FACE):
+    key = (face, size, text)
+    text_size = self.sizes.get(key)
+    if text_size is None:
+      if len(self.sizes) >= self.max_sizes:
+        self.sizes.clear()
+      font = self.get(size, face)
+      if hasattr(font, "getsize"):
+        text_size = font.getsize(text)
+      else:
+        # newer Pillow dropped getsize, the bbox corner is the same size
+        left, top, right, bottom = font.getbbox(text)
+        text_size = (right, bottom)
+      self.sizes[key] = text_size
+    return text_size
+
+# the registry shared by every tank and script
+registry = FontRegistry()
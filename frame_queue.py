@@ -0,0 +1,172 @@
+import collections
+import threading
+from timeit import default_timer
+
+from PIL import Image
+
+from frame_stats import RollingStats
+
+###################################
+# FrameQueue class
+#
+#   A bounded queue of finished frames between a thread that renders them
+#     and a thread that puts them on the display, so the next frame can be
+#     composed while the last one is still being written to the panels.
+#
+#   Frames live in a pool of depth + 2 buffers (one being rendered, depth
+#     waiting, one being shown), made once, so a queued frame is never the
+#     same image the renderer is drawing into and nothing is allocated per
+#     frame.  The renderer takes a buffer(), copies or draws its frame into
+#     it and put()s it; the display side get()s it, shows it and hands it
+#     back with done().
+#
+#   When depth frames are already waiting, policy decides what put() does:
+#       "drop_oldest" - throw away the oldest waiting frame (lowest latency)
+#       "drop_newest" - throw away the new frame (keeps what's queued)
+#       "block"       - wait for the display to take one (no frames lost)
+#
+#   Every frame carries the time its icons were moved, so done() can keep
+#     the end-to-end latency from move() to display.  The queue depth after
+#     each put is kept too (see stats).
+###################################
+class FrameQueue():
+
+  POLICIES = ("drop_oldest", "drop_newest", "block")
+
+  ############################################
+  # Init method
+  #   size and mode are those of the frames (the compositor's frame)
+  #   depth is how many finished frames can wait for the display
+  #   window is how many frames the latency statistics cover
+  ###############################################
+  def __init__(self, size, mode, depth=2, policy="block", window=500):
+    if policy not in self.POLICIES:
+      raise ValueError("unknown queue policy: " + str(policy))
+    if depth < 1:
+      raise ValueError("queue depth must be at least 1")
+    self.size = size
+    self.mode = mode
+    self.depth = depth
+    self.policy = policy
+    self.condition = threading.Condition()
+    self.free = [Image.new(mode, size) for count in range(depth + 2)]
+    self.waiting = collections.deque()
+    self.closed = False
+
+    self.queued = 0
+    self.shown = 0
+    self.dropped = 0
+    self.depth_total = 0
+    self.depth_max = 0
+    self.latency = RollingStats(window)
+
+  ############################################
+  # buffer method
+  #   Renderer side:  waits for a free buffer and returns it, or None once
+  #     the queue is closed.
+  ###############################################
+  def buffer(self):
+    with self.condition:
+      while not self.free and not self.closed:
+        self.condition.wait()
+      if self.closed:
+        return None
+      return self.free.pop()
+
+  ############################################
+  # copy method
+  #   Renderer side:  copies frame into a free buffer (one memcpy, no new
+  #     image) and returns the buffer, or None once the queue is closed.
+  ###############################################
+  def copy(self, frame):
+    image = self.buffer()
+    if image is not None:
+      frame.load()
+      image.im.paste(frame.im, (0, 0) + self.size)
+    return image
+
+  ############################################
+  # put method
+  #   Renderer side:  queues a buffer holding a finished frame.  moved is
+  #     the default_timer() time its icons were moved.  Returns False if
+  #     a frame was dropped to make room (or the queue is closed).
+  ###############################################
+  def put(self, image, moved):
+    with self.condition:
+      kept = True
+      if self.policy == "block":
+        while len(self.waiting) >= self.depth and not self.closed:
+          self.condition.wait()
+      if self.closed:
+        self.free.append(image)
+        return False
+      if len(self.waiting) >= self.depth:
+        self.dropped += 1
+        kept = False
+        if self.policy == "drop_newest":
+          self.free.append(image)
+          return False
+        oldest, oldest_moved = self.waiting.popleft()
+        self.free.append(oldest)
+
+      self.waiting.append((image, moved))
+      self.queued += 1
+      self.depth_total += len(self.waiting)
+      self.depth_max = max(self.depth_max, len(self.waiting))
+      self.condition.notify_all()
+      return kept
+
+  ############################################
+  # get method
+  #   Display side:  waits for the oldest waiting frame and returns (image,
+  #     moved).  Once the queue is closed the frames still waiting are
+  #     handed out, then None.
+  ###############################################
+  def get(self):
+    with self.condition:
+      while not self.waiting and not self.closed:
+        self.condition.wait()
+      if not self.waiting:
+        return None
+      frame = self.waiting.popleft()
+      self.condition.notify_all()
+      return frame
+
+  ############################################
+  # done method
+  #   Display side:  a frame from get has been shown.  Files its latency
+  #     and gives the buffer back.
+  ###############################################
+  def done(self, image, moved):
+    self.latency.add(default_timer() - moved)
+    with self.condition:
+      self.shown += 1
+      self.free.append(image)
+      self.condition.notify_all()
+
+  ############################################
+  # close method
+  #   Wakes up both sides;  the renderer stops, the display side finishes
+  #     whatever is still waiting.
+  ###############################################
+  def close(self):
+    with self.condition:
+      self.closed = True
+      self.condition.notify_all()
+
+  ############################################
+  # stats method
+  #   Returns frames queued, shown and dropped, the mean and largest queue
+  #     depth, and the move-to-display latency (see RollingStats.summary).
+  ###############################################
+  def stats(self):
+    return {
+      "policy": self.policy,
+      "depth": self.depth,
+      "queued": self.queued,
+      "shown": self.shown,
+      "dropped": self.dropped,
+      "mean_depth": float(self.depth_total) / self.queued if self.queued else 0.0,
+      "max_depth": self.depth_max,
+      "latency": self.latency.summary(),
+    }
@@ -0,0 +1,209 @@
+import collections
+import signal
+import sys
+import time
+from timeit import default_timer
+
+###################################
+# RollingStats class
+#
+#   Keeps the last window timings (in seconds) and summarises them.
+###################################
+class RollingStats():
+
+  def __init__(self, window):
+    self.times = collections.deque(maxlen=window)
+    self.count = 0
+
+  def add(self, seconds):
+    self.times.append(seconds)
+    self.count += 1
+
+  ############################################
+  # summary method
+  #   Returns count (all time), and mean/p50/p99/max in milliseconds over
+  #     the window.
+  ###############################################
+  def summary(self):
+    ordered = sorted(self.times)
+    if not ordered:
+      return {"count": self.count, "mean_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    def at(p):
+      return 1000.0 * ordered[int(round((len(ordered) - 1) * p))]
+    return {
+      "count": self.count,
+      "mean_ms": 1000.0 * sum(ordered) / len(ordered),
+      "p50_ms": at(0.50),
+      "p99_ms": at(0.99),
+      "max_ms": 1000.0 * ordered[-1],
+    }
+
+############################################
+# icon_key
+#   The name an icon's timings are filed under: its position in the tank 
+#     (so the three clownfish stay apart) and its filename.
+###############################################
+def icon_key(index, icon):
+  return "%d %s" % (index, getattr(icon, "filename", "icon"))
+
+###################################
+# FrameProfiler class
+#
+#   Times the stages of each frame (background, move, paste, ...) and how
+#     long each icon takes, keeping a rolling window of per-frame totals.
+#
+#   Tank.show only calls into the profiler when one is attached, so leaving
+#     it off costs one check per stage.  Each call charges the time since 
+#     the previous one, so the typical use is:
+#       profiler.start()
+#       ...work...
+#       profiler.stage("background")
+#       ...icon work...
+#       profiler.icon(icon_key(index, icon), "paste")
+#       profiler.end_frame()
+#
+#   The report can be written every interval seconds, or whenever the
+#     process gets a signal (see dump_on_signal):
+#       kill -USR1 <pid>
+###################################
+class FrameProfiler():
+
+  ############################################
+  # Init method
+  #   window is how many frames the statistics cover
+  #   interval is how often (seconds) to write the report, None for never
+  #   out is where the report goes
+  ###############################################
+  def __init__(self, window=500, interval=None, out=None):
+    self.window = window
+    self.interval = interval
+    self.out = out
+    self.stages = collections.OrderedDict()
+    self.icons = {}
+    self.counters = collections.OrderedDict()
+    self.frame_stats = RollingStats(window)
+    self.current = {}
+    self.current_icons = {}
+    self.frame_start = None
+    self.mark = None
+    self.last_dump = time.time()
+    self.dump_requested = False
+
+  ############################################
+  # start method
+  #   Marks the start of a frame.
+  ###############################################
+  def start(self):
+    self.frame_start = default_timer()
+    self.mark = self.frame_start
+
+  ############################################
+  # stage method
+  #   Adds the time since the last call to the named stage of this frame.
+  ###############################################
+  def stage(self, name):
+    now = default_timer()
+    self.current[name] = self.current.get(name, 0.0) + (now - self.mark)
+    self.mark = now
+
+  ############################################
+  # icon method
+  #   Like stage, but also charges the time to the icon named key.
+  ###############################################
+  def icon(self, key, name):
+    now = default_timer()
+    spent = now - self.mark
+    self.current[name] = self.current.get(name, 0.0) + spent
+    self.current_icons[key] = self.current_icons.get(key, 0.0) + spent
+    self.mark = now
+
+  ############################################
+  # count method
+  #   Adds amount to a named running total (e.g. icons skipped).
+  ###############################################
+  def count(self, name, amount=1):
+    self.counters[name] = self.counters.get(name, 0) + amount
+
+  ############################################
+  # end_frame method
+  #   Files this frame's stage and icon totals, and writes the report if
+  #     it's time (or a signal asked for it).
+  ###############################################
+  def end_frame(self):
+    if self.frame_start is not None:
+      self.frame_stats.add(default_timer() - self.frame_start)
+      self.frame_start = None
+    for name, spent in self.current.items():
+      if name not in self.stages:
+        self.stages[name] = RollingStats(self.window)
+      self.stages[name].add(spent)
+    for key, spent in self.current_icons.items():
+      if key not in self.icons:
+        self.icons[key] = RollingStats(self.window)
+      self.icons[key].add(spent)
+    self.current = {}
+    self.current_icons = {}
+
+    if self.dump_requested:
+      self.dump_requested = False
+      self.dump()
+    elif self.interval is not None and time.time() - self.last_dump >= self.interval:
+      self.dump()
+
+  ############################################
+  # summary method
+  #   Returns the statistics as a dictionary (for saving as JSON).
+  ###############################################
+  def summary(self):
+    return {
+      "frame": self.frame_stats.summary(),
+      "stages": dict((name, stats.summary()) for name, stats in self.stages.items()),
+      "icons": dict((key, stats.summary()) for key, stats in self.icons.items()),
+      "counters": dict(self.counters),
+    }
+
+  ############################################
+  # report method
+  #   Returns the statistics as a printable table, slowest icons first.
+  ###############################################
+  def report(self):
+    line = "%-40s %8s %8s %8s %8s %8s"
+    number = "%-40s %8d %8.3f %8.3f %8.3f %8.3f"
+    lines = [line % ("stage (ms per frame)", "count", "mean", "p50", "p99", "max")]
+    rows = [("frame", self.frame_stats)] + list(self.stages.items())
+    for name, stats in rows:
+      summary = stats.summary()
+      lines.append(number % (name, summary["count"], summary["mean_ms"], summary["p50_ms"],
+                             summary["p99_ms"], summary["max_ms"]))
+    if self.icons:
+      lines.append("")
+      lines.append(line % ("icon (ms per frame)", "count", "mean", "p50", "p99", "max"))
+      icons = [(stats.summary(), key) for key, stats in self.icons.items()]
+      icons.sort(key=lambda entry: -entry[0]["mean_ms"])
+      for summary, key in icons:
+        lines.append(number % (key[-40:], summary["count"], summary["mean_ms"], summary["p50_ms"],
+                               summary["p99_ms"], summary["max_ms"]))
+    if self.counters:
+      lines.append("")
+      for name, total in self.counters.items():
+        lines.append("%-40s %8d" % (name, total))
+    return "\n".join(lines)
+
+  ############################################
+  # dump method
+  #   Writes the report to out (stderr by default).
+  ###############################################
+  def dump(self):
+    out = self.out or sys.stderr
+    out.write(self.report() + "\n\n")
+    out.flush()
+    self.last_dump = time.time()
+
+  ############################################
+  # dump_on_signal method
+  #   Writes the report at the end of the frame after signum arrives.
+  ###############################################
+  def dump_on_signal(self, signum=signal.SIGUSR1):
+    def request_dump(signum, frame):
+      self.dump_requested = True
+    signal.signal(signum, request_dump)
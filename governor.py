@@ -0,0 +1,140 @@
+import collections
+
+###################################
+# LoadGovernor class
+#
+#   Keeps the tank on time when it has more to draw than the Pi can
+#     manage, by shedding work, and takes the work back on when there's
+#     room again.
+#
+#   Tank.run tells it how long each frame took to make (see frame).  Every
+#     window frames it looks at the slow end of those times (the 90th
+#     percentile) and moves one level along a fixed ladder of settings:
+#       - first the frame rate comes down, through fps_steps
+#       - then the date/time text is redrawn less often, every
+#         text_intervals seconds instead of every second
+#       - then only the most recently added icons are drawn (and moved), a
+#         fraction (icon_fractions) of them, but never fewer than min_icons
+#     Frames running over their budget (one frame period) step down a
+#     level, and frames fitting in headroom of the budget of the level
+#     above step back up, undoing the last change first.  Icons swim at the
+#     same speed whatever the frame rate (see motion.py).
+#
+#   Every change is counted (steps_down, steps_up, and in the tank's
+#     profiler when it has one) and kept in changes as (frame number,
+#     "down" or "up", level);  stats returns the current settings.
+###################################
+class LoadGovernor():
+
+  ############################################
+  # Init method
+  #   window is how many frames each decision looks at
+  #   headroom is the fraction of the budget above that frames must fit in
+  #     before stepping back up
+  ###############################################
+  def __init__(self, fps_steps=(40, 30, 25, 20), text_intervals=(2, 5, 10),
+               icon_fractions=(0.75, 0.5, 0.25), min_icons=4, window=50, headroom=0.7):
+    self.fps_steps = fps_steps
+    self.text_intervals = text_intervals
+    self.icon_fractions = icon_fractions
+    self.min_icons = min_icons
+    self.window = window
+    self.headroom = headroom
+    self.times = collections.deque(maxlen=window)
+    self.tank = None
+    self.scheduler = None
+    self.ladder = []
+    self.level = 0
+    self.frames = 0
+    self.steps_down = 0
+    self.steps_up = 0
+    self.changes = []
+    self.recent = 0.0
+
+  ############################################
+  # start method
+  #   Takes charge of tank, running at scheduler's frame rate, and builds
+  #     the ladder of (fps, text interval, icon fraction) settings down
+  #     from there.
+  ###############################################
+  def start(self, tank, scheduler):
+    self.tank = tank
+    self.scheduler = scheduler
+    fps = scheduler.fps
+    self.ladder = [(fps, 1, None)]
+    for step in self.fps_steps:
+      if step < fps:
+        fps = step
+        self.ladder.append((fps, 1, None))
+    interval = 1
+    for interval in self.text_intervals:
+      self.ladder.append((fps, interval, None))
+    for fraction in self.icon_fractions:
+      self.ladder.append((fps, interval, fraction))
+    self.level = 0
+    self.times.clear()
+    self.apply()
+
+  ############################################
+  # frame method
+  #   Call after each frame with how long (seconds) it took to make.
+  ###############################################
+  def frame(self, seconds):
+    self.frames += 1
+    self.times.append(seconds)
+    if len(self.times) < self.window:
+      return
+    ordered = sorted(self.times)
+    self.recent = ordered[int(0.9 * (len(ordered) - 1))]
+    self.times.clear()
+
+    if self.level < len(self.ladder) - 1 and self.recent > 1.0 / self.ladder[self.level][0]:
+      self.shift(1)
+    elif self.level > 0 and self.recent < self.headroom / self.ladder[self.level - 1][0]:
+      self.shift(-1)
+
+  ############################################
+  # shift method
+  #   Moves step levels down the ladder (negative for up) and applies it.
+  ###############################################
+  def shift(self, step):
+    self.level += step
+    direction = "down" if step > 0 else "up"
+    if step > 0:
+      self.steps_down += 1
+    else:
+      self.steps_up += 1
+    self.changes.append((self.frames, direction, self.level))
+    if self.tank.profiler is not None:
+      self.tank.profiler.count("governor steps " + direction)
+    self.apply()
+
+  ############################################
+  # apply method
+  #   Puts the current level's settings into the tank and scheduler.
+  ###############################################
+  def apply(self):
+    fps, interval, fraction = self.ladder[self.level]
+    self.scheduler.set_fps(fps)
+    self.tank.text_interval = interval
+    if fraction is None:
+      self.tank.icon_limit = None
+    else:
+      self.tank.icon_limit = max(self.min_icons, int(len(self.tank.icons) * fraction))
+
+  ############################################
+  # stats method
+  #   Returns the current level and settings and the changes made so far.
+  ###############################################
+  def stats(self):
+    fps, interval, fraction = self.ladder[self.level]
+    return {
+      "level": self.level,
+      "levels": len(self.ladder),
+      "fps": fps,
+      "text_interval": interval,
+      "icon_limit": self.tank.icon_limit,
+      "steps_down": self.steps_down,
+      "steps_up": self.steps_up,
+      "recent_p90_ms": 1000.0 * self.recent,
+    }
@@ -0,0 +1,38 @@
+###################################
+# motion helpers
+#
+#   Icons swim at a velocity in pixels per second.  Each frame they cover
+#     velocity * (seconds since the last frame), and a sub-pixel travel
+#     accumulator keeps the part of a pixel left over, so a slow fish moves
+#     one pixel every few frames and a late frame moves it a little further.
+#     The swimming speed is the same whatever the frame rate.
+#
+#   The old slowdown setting (move one pixel every slowdown frames) is
+#     turned into a velocity at NOMINAL_FPS, the rate the tank was tuned
+#     at, so tanks set up with setSlowdown swim as they always did there.
+###################################
+
+NOMINAL_FPS = 50
+
+# fractions of a pixel that add up to a whole one can fall just short of
+# it in floating point, this lets them count
+EPSILON = 1e-9
+
+############################################
+# slowdown_velocity
+#   The velocity (pixels per second) of moving one pixel every slowdown 
+#     frames at fps (NOMINAL_FPS unless a tank was tuned at another rate).
+#     0 and 1 both mean every frame.
+###############################################
+def slowdown_velocity(slowdown, fps=NOMINAL_FPS):
+  return float(fps) / max(slowdown, 1)
+
+############################################
+# advance
+#   Adds dt seconds at velocity to travel.  Returns (whole pixels to move,
+#     the travel left over).
+###############################################
+def advance(travel, velocity, dt):
+  travel += velocity * dt
+  pixels = int(travel + EPSILON)
+  return pixels, travel - pixels
@@ -1,10 +1,17 @@
-from time import sleep
-import datetime
 
 import random
 
-from rgbmatrix import RGBMatrix, RGBMatrixOptions
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
+from clock import Clock
+from display import MatrixBackend, display_args, make_display
+from scheduler import FrameScheduler, monotonic
+from fonts import registry
+from motion import advance, slowdown_velocity
+from overlay import TextOverlay
+from sprite import load_sprite, load_background
+
+# the frame rate this tank was tuned at, slowdowns are worked out at it
+TUNED_FPS = 40
 
 ###################################
 # icon class 
@@ -14,7 +21,8 @@ from PIL import Image, ImageDraw, ImageFont
 #   On initialization, you specify an image file, which colors you want as 
 #     transparent, and the desired size (in pixels) of that icon.
 #
-#   The move method updates the image's x and y position.
+#   The move method updates the image's x and y position, at a velocity in
+#     pixels per second (see motion.py).
 #  
 #   The show method pastes the icon into an image.   
 ###################################
@@ -38,40 +46,30 @@ class Icon():
     self.x_size = x_size
     self.y_size = y_size
 
-    self.image = Image.open(filename)
-    self.image = self.image.convert("RGBA")
-    self.image = self.image.resize((x_size,y_size))
-
     self.slowdown = 1
-    self.movecount = 1
-
-    # now that we have our image, we want to make a transparency mask.
-    # start by looking at each pixel, and if it's in our transparency 
-    # range, make the mask transparent (black).  Otherwise, make it 
-    # fully opaque (white)
-    self.mask = Image.new("L", (x_size,y_size))
-    icon_data = self.image.getdata()
-    mask_data = []
-    for item in icon_data:
-      # uncomment this line if you need to inspect pixels in your image
-      # print item
-
-      # is our pixel in range?  
-      if ((item[0] >= rtr[0] and item[0] <= rtr[1]) and \
-          (item[1] >= gtr[0] and item[1] <= gtr[1]) and \
-          (item[2] >= btr[0] and item[2] <= btr[1])):
-        mask_data.append(0)
-      else:
-        mask_data.append(255)
-      self.mask.putdata(mask_data)
+    self.velocity = slowdown_velocity(1, TUNED_FPS)
+    self.travel = 0.0
+
+    # load our image along with its transparency mask.  Any pixel in our 
+    # transparency range is transparent (black) in the mask, everything else
+    # is fully opaque (white).  Warm starts come straight from the sprite cache.
+    self.image, self.mask = load_sprite(filename, (x_size,y_size), rtr, gtr, btr)
 
   ############################################
   # setSlowdown method 
-  #   pastes the icon into the passed image
+  #   Moves one pixel every slowdown frames at TUNED_FPS (the velocity is
+  #     worked out from it).
   ###############################################
-  
   def setSlowdown(self,slowdown):
     self.slowdown = slowdown
+    self.velocity = slowdown_velocity(slowdown, TUNED_FPS)
+
+  ############################################
+  # setVelocity method 
+  #   velocity is in pixels per second
+  ###############################################
+  def setVelocity(self,velocity):
+    self.velocity = velocity
   
   ############################################
   # show method 
@@ -84,17 +82,20 @@ class Icon():
   ############################################
   # move 
   #   Currenly only supports moving right-to-left.
-  #   Updates our x and y position to the "next" spot.  
+  #   Updates our x and y position to the "next" spot, dt seconds on at our
+  #     velocity (one frame at TUNED_FPS by default).
   #   If we go off the screen, we'll reset x, and pick a new
   #     random y.  
   ###############################################
-  def move(self):
-    if self.movecount < self.slowdown:
-      self.movecount += 1
+  def move(self, dt=None):
+    if dt is None:
+      dt = 1.0 / TUNED_FPS
+    # slower icons wait until they've covered a whole pixel
+    pixels, self.travel = advance(self.travel, self.velocity, dt)
+    if pixels == 0:
       return
-    # move one pixel left.
-    self.x = self.x - 1
-    self.movecount = 1
+    # move left.
+    self.x = self.x - pixels
     
     # if we're off the screen, reset to the right, and pick a new y coordinate.
     if (self.x < 0-self.x_size):
@@ -116,34 +117,47 @@ class Tank():
 
   ############################################
   # Init method 
+  #   clock is the Clock that formats our time text.  By default it shows 
+  #     the Pi's local time.
+  #   display is the backend frames are shown on (see display.py).  By 
+  #     default it's the LED panels.
   ###############################################
-  def __init__(self, panel_rows, panel_columns, num_horiz_panels, num_vert_panels):
+  def __init__(self, panel_rows, panel_columns, num_horiz_panels, num_vert_panels, clock=None, display=None):
  
     self.total_rows = panel_rows * num_vert_panels
     self.total_columns = panel_columns * num_horiz_panels
 
-    options = RGBMatrixOptions()
-    options.rows = matrix_rows 
-    options.cols = matrix_columns 
-    options.chain_length = num_horiz_panels
-    options.parallel = num_vert_panels 
-    options.hardware_mapping = 'regular' 
-    #options.gpio_slowdown = 2
-
-    self.matrix = RGBMatrix(options = options)
+    # where our frames go, the LED panels unless we're told otherwise
+    if display is None:
+      display = MatrixBackend(panel_rows, panel_columns, num_horiz_panels, num_vert_panels)
+    self.output = display
 
     self.background = None
     self.icons = []
 
-    self.screen = Image.new("RGBA",(self.total_columns,self.total_rows))
+    # one frame buffer, in the display's own mode, reused every frame
+    self.screen = Image.new(self.output.mode,(self.total_columns,self.total_rows))
+    self.fonts = registry
+    if clock is None:
+      clock = Clock(None, {"time": "%H:%M:%S"})
+    self.clock = clock
+    self.overlay = TextOverlay((self.total_columns,self.total_rows), self.fonts)
+    # icons move by the real time between frames, at most max_step seconds
+    # at once (so a long stall doesn't send them flying).  Set frame_time
+    # to move them by that much every frame instead.
+    self.frame_time = None
+    self.max_step = 0.25
+    self.last_move = None
 
   ############################################
   # set_background 
+  #   Converted to the display's mode once, here, rather than every frame.
   ############################################
   def set_background(self, filename):
-    self.background = Image.open(filename)
-    self.background.convert("RGBA")
-    self.background = self.background.resize((self.total_columns,self.total_rows))
+    background = load_background(filename, (self.total_columns,self.total_rows))
+    if background.mode != self.output.mode:
+      background = background.convert(self.output.mode)
+    self.background = background
    
   ############################################
   # add_icon 
@@ -151,6 +165,31 @@ class Tank():
   def add_icon(self, icon):
     self.icons.append(icon)
 
+  ############################################
+  # elapsed
+  #   Returns how far (seconds) to move the icons this frame.
+  ###############################################
+  def elapsed(self):
+    if self.frame_time is not None:
+      return self.frame_time
+    now = monotonic()
+    last = self.last_move
+    self.last_move = now
+    if last is None:
+      return 1.0 / TUNED_FPS
+    return min(now - last, self.max_step)
+
+  ############################################
+  # layout_text
+  #   Returns the text overlay item for our time string.
+  ###############################################
+  def layout_text(self, time_string):
+    # do some math to center our time string
+    time_size = self.fonts.getsize(time_string, 14)
+    time_x = (self.total_columns - time_size[0])/2
+    time_y = (self.total_rows - time_size[1])/2 
+    return [((time_x,time_y), time_string, 14, (255,0,0,))]
+
   ############################################
   # show
   #   Displays the whole tank, and then moves any icon elements. 
@@ -160,48 +199,59 @@ class Tank():
     #restore background
     self.screen.paste(self.background,(0,0))
     
-    # move and paste in our icons 
+    # move our icons by however long it's been since the last frame, and
+    # paste them in
+    dt = self.elapsed()
     for icon in self.icons:
-      icon.move()
+      icon.move(dt)
       icon.show(self.screen)
 
-    self.screen = self.screen.convert("RGB")
-    screen_draw = ImageDraw.Draw(self.screen)
+    # draw text on top, the text layer is only redrawn when the time changes
+    if self.clock.tick():
+      self.overlay.update(self.clock.strings("time"), self.layout_text)
+    self.overlay.show(self.screen)
 
-    # draw text on top
-    currentDT = datetime.datetime.now()
-    time_string = currentDT.strftime("%H:%M:%S")
-
-    # do some math to center our time string
-    fnt = ImageFont.truetype("Arial_Bold.ttf",14)
-    time_size = fnt.getsize(time_string)
-    time_x = (self.total_columns - time_size[0])/2
-    time_y = (self.total_rows - time_size[1])/2 
-    screen_draw.text((time_x,time_y),time_string, fill = (255,0,0,), font = fnt)
+    self.output.show(self.screen)
 
-    self.matrix.SetImage(self.screen,0,0)
+  ############################################
+  # run
+  #   Shows the tank over and over at fps frames per second until 
+  #     interrupted (or for the given number of frames).  policy is what
+  #     to do with late frames, "drop" or "catchup" (see FrameScheduler).
+  #   The scheduler is kept as self.scheduler so its stats can be read.
+  ###############################################
+  def run(self, fps=40, policy="drop", frames=None):
+    self.scheduler = FrameScheduler(fps, policy)
+    try:
+      while frames is None or self.scheduler.frames < frames:
+        self.show()
+        self.scheduler.wait()
+    finally:
+      self.output.close()
 
-  
 ###################################
 # Main code 
 ###################################
-matrix_rows = 32
-matrix_columns = 32
-num_horiz = 5
-num_vert = 3
-
-space_tank = Tank(matrix_rows, matrix_columns, num_horiz, num_vert)
-space_tank.set_background("images/tanks/andr_small.jpeg")
-tie = Icon("images/icons/tie-fighter-01.jpg",(242,242),(242,242),(242,242),40,40,space_tank.total_columns,space_tank.total_rows)
-fish = Icon("images/icons/clownfish_left.jpg",(0,10),(200,255),(0,10),40,25,space_tank.total_columns,space_tank.total_rows)
-fish.setSlowdown(3)
-space_tank.add_icon(tie)
-space_tank.add_icon(fish)
-
-try:
-  print("Press CTRL-C to stop")
-  while True:
-    space_tank.show()
-    sleep(.025)
-except KeyboardInterrupt:
-  exit(0)
+if __name__ == "__main__":
+  matrix_rows = 32
+  matrix_columns = 32
+  num_horiz = 5
+  num_vert = 3
+
+  #pick where frames go from the command line, the LED panels by default
+  display_name, display_options = display_args()
+  display = make_display(display_name, matrix_rows, matrix_columns, num_horiz, num_vert, **display_options)
+
+  space_tank = Tank(matrix_rows, matrix_columns, num_horiz, num_vert, display=display)
+  space_tank.set_background("images/tanks/andr_small.jpeg")
+  tie = Icon("images/icons/tie-fighter-01.jpg",(242,242),(242,242),(242,242),40,40,space_tank.total_columns,space_tank.total_rows)
+  fish = Icon("images/icons/clownfish_left.jpg",(0,10),(200,255),(0,10),40,25,space_tank.total_columns,space_tank.total_rows)
+  fish.setSlowdown(3)
+  space_tank.add_icon(tie)
+  space_tank.add_icon(fish)
+
+  try:
+    print("Press CTRL-C to stop")
+    space_tank.run(fps=40)
+  except KeyboardInterrupt:
+    exit(0)
@@ -0,0 +1,92 @@
+from PIL import Image, ImageChops, ImageDraw
+
+from fonts import registry
+
+# any coverage at all gets the full text color, the mask does the blending
+_SOLID = [0] + [255] * 255
+
+###################################
+# TextOverlay class
+#
+#   The clock and banner text that sits on top of the tank.
+#
+#   Drawing and measuring text every frame is expensive, but the strings only
+#     change once a second (or never), so the text is rendered into a layer
+#     with its own mask and only re-rendered when the strings change.  Each
+#     frame it's put on the screen with a single paste.
+#
+#   Pasting the layer gives the same pixels as drawing the text straight
+#     onto the screen, as long as the text items don't overlap.
+###################################
+class TextOverlay():
+
+  ############################################
+  # Init method
+  #   size is the (columns, rows) size of the whole screen
+  #   fonts is the FontRegistry used to look up text sizes
+  ###############################################
+  def __init__(self, size, fonts=registry):
+    self.size = size
+    self.fonts = fonts
+    self.key = None
+    self.layer = None
+    self.mask = None
+    self.position = (0,0)
+
+  ############################################
+  # update method
+  #   key is whatever the text depends on (usually the tuple of strings).
+  #   layout is only called when key changes, with key's items as
+  #     arguments, and returns a list of (xy, text, font_size, fill) items.
+  #   Returns True if the layer was re-rendered.
+  ###############################################
+  def update(self, key, layout):
+    if key == self.key:
+      return False
+    self.render(layout(*key))
+    self.key = key
+    return True
+
+  ############################################
+  # render method
+  #   Draws the items into a fresh layer.  The text color is painted solid
+  #     under every covered pixel and the anti-aliasing lives in the mask,
+  #     so pasting blends exactly like ImageDraw.text does.
+  ###############################################
+  def render(self, items):
+    layer = Image.new("RGB", self.size)
+    mask = Image.new("L", self.size)
+    for xy, text, font_size, fill in items:
+      coverage = Image.new("L", self.size)
+      ImageDraw.Draw(coverage).text(xy, text, fill = 255, font = self.fonts.get(font_size))
+      layer.paste(fill, (0,0), coverage.point(_SOLID))
+      mask = ImageChops.lighter(mask, coverage)
+
+    # only keep the part of the layer that has text in it
+    box = mask.getbbox()
+    if box is None:
+      self.layer = None
+      self.mask = None
+      return
+    self.layer = layer.crop(box)
+    self.mask = mask.crop(box)
+    self.position = box[:2]
+
+  ############################################
+  # box method
+  #   Returns the (left, top, right, bottom) area the overlay covers, or
+  #     None if there's nothing to draw.
+  ###############################################
+  def box(self):
+    if self.layer is None:
+      return None
+    return (self.position[0], self.position[1],
+            self.position[0] + self.layer.size[0], self.position[1] + self.layer.size[1])
+
+  ############################################
+  # show method
+  #   pastes the overlay into the passed image
+  ###############################################
+  def show(self, image):
+    if self.layer is not None:
+      image.paste(self.layer, self.position, self.mask)
@@ -0,0 +1,230 @@
+import ctypes
+import multiprocessing
+import sys
+
+import numpy
+from PIL import Image
+
+from display import DisplayBackend, make_display
+
+###################################
+# FrameRing class
+#
+#   A ring of frame buffers in shared memory, for handing frames from the
+#     process that renders them to the process that displays them without
+#     sending the pixels through a pipe.
+#
+#   There are slots buffers of width x height RGBX pixels.  The renderer
+#     waits for a free slot, draws into it and publishes it; the display
+#     side waits for a filled slot, shows it and releases it.  Two
+#     semaphores count the free and filled slots, so the renderer blocks
+#     when the display falls slots frames behind, and slots are used in
+#     order, so only sequence numbers cross between the processes:  each
+#     published slot is stamped with its frame number, and -1 means stop.
+#
+#   arrays and images are numpy and PIL views of each slot, made in
+#     whichever process uses them (they don't survive pickling, the shared
+#     memory does).
+###################################
+class FrameRing():
+
+  STOP = -1
+
+  def __init__(self, width, height, slots=3):
+    self.size = (width, height)
+    self.slots = slots
+    self.buffer = multiprocessing.RawArray(ctypes.c_uint8, slots * width * height * 4)
+    self.sequence = multiprocessing.RawArray(ctypes.c_long, slots)
+    self.free = multiprocessing.Semaphore(slots)
+    self.filled = multiprocessing.Semaphore(0)
+    self.written = 0
+    self.read = 0
+    self._views = None
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state["_views"] = None
+    return state
+
+  ############################################
+  # views
+  #   Returns (arrays, images) for the slots, making them on first use.
+  ###############################################
+  def views(self):
+    if self._views is None:
+      width, height = self.size
+      pixels = numpy.frombuffer(self.buffer, numpy.uint8).reshape((self.slots, height, width, 4))
+      arrays = [pixels[slot] for slot in range(self.slots)]
+      images = [Image.frombuffer("RGBX", self.size, array, "raw", "RGBX", 0, 1) for array in arrays]
+      self._views = (arrays, images)
+    return self._views
+
+  ############################################
+  # acquire method
+  #   Renderer side:  waits for the next slot to be free and returns it, or
+  #     None if none came free within timeout seconds.
+  ###############################################
+  def acquire(self, timeout=None):
+    if not self.free.acquire(True, timeout):
+      return None
+    return self.written % self.slots
+
+  ############################################
+  # publish method
+  #   Renderer side:  hands the slot from acquire to the display, stamped
+  #     with the next frame number (or STOP).
+  ###############################################
+  def publish(self, slot, stop=False):
+    self.sequence[slot] = self.STOP if stop else self.written
+    self.written += 1
+    self.filled.release()
+
+  ############################################
+  # get method
+  #   Display side:  waits for the next filled slot.  Returns (slot,
+  #     sequence number), or None if nothing came within timeout seconds.
+  ###############################################
+  def get(self, timeout=None):
+    if not self.filled.acquire(True, timeout):
+      return None
+    slot = self.read % self.slots
+    self.read += 1
+    return slot, self.sequence[slot]
+
+  ############################################
+  # release method
+  #   Display side:  gives a shown slot back to the renderer.
+  ###############################################
+  def release(self, slot):
+    self.free.release()
+
+############################################
+# display_loop
+#   Runs in the display process:  creates the real backend there (so the
+#     panels belong to this process) and shows frames from the ring until
+#     told to stop.  shown counts frames put on the display, and missed
+#     counts gaps in the sequence numbers (there shouldn't be any).
+###############################################
+def display_loop(ring, shown, missed, display, display_args, display_options):
+  backend = make_display(display, *display_args, **display_options)
+  arrays, images = ring.views()
+  expected = 0
+  try:
+    while True:
+      slot, sequence = ring.get()
+      if sequence == FrameRing.STOP:
+        ring.release(slot)
+        return
+      if sequence != expected:
+        missed.value += sequence - expected
+      expected = sequence + 1
+      backend.show(images[slot])
+      shown.value += 1
+      ring.release(slot)
+  finally:
+    backend.close()
+
+###################################
+# PipelineBackend class
+#
+#   Splits the tank over two processes (and so two cores):  the tank moves
+#     its icons and composes frames in this process, and a second process
+#     owns the real display (display, usually "matrix") and puts frames on
+#     it.  Frames are handed over through a FrameRing in shared memory.
+#
+#   A compositor that can draw into any buffer (ArrayCompositor) gets the
+#     next slot from target() and draws straight into shared memory, so
+#     show() only publishes its sequence number.  Frames from other
+#     compositors are copied into the slot, one memcpy without allocating.
+#
+#   shown and missed are the display process's counters (see display_loop).
+#   If the display process dies (e.g. the panels can't be opened there),
+#     the next wait for a slot raises RuntimeError rather than hanging.
+#   Needs numpy.
+###################################
+class PipelineBackend(DisplayBackend):
+
+  ############################################
+  # Init method
+  #   The panel arguments are the same as MatrixBackend's.  display and the
+  #     other options are what the display process passes to make_display.
+  #   slots is how many frames can be in flight.
+  ###############################################
+  def __init__(self, panel_rows, panel_columns, num_horiz_panels, num_vert_panels,
+               display="matrix", slots=3, gpio_slowdown=None, **options):
+    DisplayBackend.__init__(self, panel_columns * num_horiz_panels, panel_rows * num_vert_panels)
+    self.ring = FrameRing(self.width, self.height, slots)
+    self.shown = multiprocessing.RawValue(ctypes.c_long, 0)
+    self.missed = multiprocessing.RawValue(ctypes.c_long, 0)
+    self.slot = None
+
+    display_args = (panel_rows, panel_columns, num_horiz_panels, num_vert_panels, gpio_slowdown)
+    self.process = multiprocessing.Process(target=display_loop,
+                                           args=(self.ring, self.shown, self.missed, display, display_args, options))
+    self.process.daemon = True
+    self.process.start()
+
+  ############################################
+  # acquire method
+  #   Waits for a free slot for the next frame, checking every poll seconds
+  #     that the display process is still there to free one.  Returns None
+  #     if there's still no free slot after timeout seconds (None to wait
+  #     as long as it takes).
+  ###############################################
+  def acquire(self, poll=0.5, timeout=None):
+    waited = 0.0
+    while timeout is None or waited < timeout:
+      slot = self.ring.acquire(poll)
+      if slot is not None:
+        return slot
+      if not self.process.is_alive():
+        raise RuntimeError("display process exited (exit code %s)" % self.process.exitcode)
+      waited += poll
+    return None
+
+  ############################################
+  # target method
+  #   Returns (array, image) views of the slot the next frame goes in, for
+  #     a compositor to draw straight into.
+  ###############################################
+  def target(self):
+    if self.slot is None:
+      self.slot = self.acquire()
+    arrays, images = self.ring.views()
+    return arrays[self.slot], images[self.slot]
+
+  def show(self, image):
+    if self.slot is None:
+      self.slot = self.acquire()
+    arrays, images = self.ring.views()
+    if image is not images[self.slot]:
+      image.load()
+      images[self.slot].im.paste(image.im, (0, 0, self.width, self.height))
+    self.ring.publish(self.slot)
+    self.slot = None
+    self.frames += 1
+
+  ############################################
+  # close method
+  #   Lets the display process finish the frames in flight, then stops it.
+  #     If it hasn't stopped within timeout seconds (stuck on the panels, or
+  #     died part way through a frame), it's terminated, and that's logged.
+  ###############################################
+  def close(self, timeout=5.0, log=sys.stderr):
+    if self.process.is_alive():
+      try:
+        if self.slot is None:
+          self.slot = self.acquire(timeout=timeout)
+      except RuntimeError:
+        pass
+      else:
+        if self.slot is not None:
+          self.ring.publish(self.slot, stop=True)
+      self.slot = None
+    self.process.join(timeout)
+    if self.process.is_alive():
+      if log is not None:
+        log.write("display process didn't stop within %g seconds, terminating it\n" % timeout)
+        log.flush()
+      self.process.terminate()
+      self.process.join()
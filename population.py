@@ -0,0 +1,250 @@
+import random
+import time
+
+import numpy
+
+from motion import EPSILON, NOMINAL_FPS, slowdown_velocity
+from sprite import shared_sprite
+
+###################################
+# IconPopulation class
+#
+#   A whole school of icons kept as arrays, one entry per fish: position,
+#     direction, velocity and sub-pixel travel, timeout and whether it's on
+#     screen.  step() moves every one of them at once with numpy, following
+#     the same rules (and the same arithmetic) as Icon.move:
+#       - a fish off screen waits out its timeout, then comes back
+#       - a fish on screen only moves once it has covered a whole pixel
+#       - a fish that swims out of the tank starts its timeout and is put
+#         back on a random side (and height), heading inward
+#   Only the fish that leave the tank on a step need any Python work, and
+#     they use random the same way Icon does, in the same order.
+#
+#   Each fish also has an IconView (see below) that looks like an Icon, so
+#     the tank, compositors and old code can treat it as one.
+#
+#   Fish with the same picture and size share one Sprite (see shared_sprite).
+###################################
+class IconPopulation():
+
+  ############################################
+  # Init method
+  #   total_columns and total_rows are the size of the whole matrix
+  #   capacity is how many fish to make room for up front (it grows)
+  ###############################################
+  def __init__(self, total_columns, total_rows, capacity=64):
+    self.total_columns = total_columns
+    self.total_rows = total_rows
+    self.count = 0
+    self.views = []
+    self.filenames = []
+    self.sprites = []
+
+    self.x = numpy.zeros(capacity, numpy.int64)
+    self.y = numpy.zeros(capacity, numpy.int64)
+    self.x_size = numpy.zeros(capacity, numpy.int64)
+    self.y_size = numpy.zeros(capacity, numpy.int64)
+    self.direction = numpy.ones(capacity, numpy.int64)
+    self.slowdown = numpy.ones(capacity, numpy.int64)
+    self.velocity = numpy.zeros(capacity, numpy.float64)
+    self.travel = numpy.zeros(capacity, numpy.float64)
+    self.timeout = numpy.zeros(capacity, numpy.float64)
+    self.timeout_start = numpy.zeros(capacity, numpy.float64)
+    self.on_screen = numpy.ones(capacity, bool)
+
+  ############################################
+  # grow method
+  #   Doubles the room in every array.
+  ###############################################
+  def grow(self):
+    for name in ("x", "y", "x_size", "y_size", "direction", "slowdown", "velocity", "travel",
+                 "timeout", "timeout_start", "on_screen"):
+      old = getattr(self, name)
+      new = numpy.zeros(2 * len(old), old.dtype)
+      new[:len(old)] = old
+      setattr(self, name, new)
+
+  ############################################
+  # add method
+  #   Adds a fish, with the same arguments as Icon (less the tank size).
+  #     Returns its IconView.
+  ###############################################
+  def add(self, filename, rtr, gtr, btr, x_size, y_size, timeout_seconds):
+    sprite = shared_sprite(filename, (x_size,y_size), rtr, gtr, btr)
+
+    if self.count == len(self.x):
+      self.grow()
+    index = self.count
+    self.count += 1
+
+    self.x[index] = self.total_columns
+    self.y[index] = random.randint(0,self.total_rows - y_size)
+    self.x_size[index] = x_size
+    self.y_size[index] = y_size
+    self.direction[index] = 1
+    self.slowdown[index] = 1
+    self.velocity[index] = slowdown_velocity(1)
+    self.travel[index] = 0.0
+    self.timeout[index] = timeout_seconds
+    self.on_screen[index] = True
+    self.filenames.append(filename)
+    self.sprites.append(sprite)
+
+    view = IconView(self, index)
+    self.views.append(view)
+    return view
+
+  ############################################
+  # step method
+  #   Moves every fish dt seconds on (one frame at the nominal rate by 
+  #     default), like calling move(dt) on each of them.
+  #   only limits the step to one fish (by index), for IconView.move, or a 
+  #     list of them, for Tank.icon_limit.
+  ###############################################
+  def step(self, dt=None, only=None):
+    if dt is None:
+      dt = 1.0 / NOMINAL_FPS
+    count = self.count
+    now = time.time()
+    active = numpy.zeros(count, bool)
+    if only is None:
+      active[:] = True
+    else:
+      active[only] = True
+
+    on_screen = self.on_screen[:count]
+    travel = self.travel[:count]
+    x = self.x[:count]
+
+    # fish waiting off screen come back once their timeout is up, but
+    # don't move until the next step
+    returning = active & ~on_screen & (now - self.timeout_start[:count] > self.timeout[:count])
+
+    # the rest cover velocity * dt, and move once that's a whole pixel
+    swimming = active & on_screen
+    travel[swimming] += self.velocity[:count][swimming] * dt
+    pixels = numpy.zeros(count, numpy.int64)
+    pixels[swimming] = (travel[swimming] + EPSILON).astype(numpy.int64)
+    moving = pixels > 0
+    travel[moving] -= pixels[moving]
+
+    # fish that have left the tank start their timeout and go back to a
+    # random side, in order so random is used just like Icon.move
+    leaving = moving & ((x < -self.x_size[:count]) | (x > self.total_columns))
+    for index in numpy.flatnonzero(leaving):
+      on_screen[index] = False
+      self.timeout_start[index] = now
+      directionChooser = random.randint(1,11)
+      #direction is right
+      if directionChooser % 2 == 0:
+        self.direction[index] = 1
+        x[index] = 0 - self.x_size[index]
+      #direction is left
+      else:
+        self.direction[index] = -1
+        x[index] = self.total_columns
+      if self.y_size[index] >= self.total_rows:
+        self.y[index] = random.randint(0,self.total_rows)
+      else:
+        self.y[index] = random.randint(0,self.total_rows - int(self.y_size[index]))
+
+    # left or right by the whole pixels covered
+    x[moving] += self.direction[:count][moving] * pixels[moving]
+    on_screen[returning] = True
+
+############################################
+# _array_property
+#   A property for IconView that reads and writes this fish's entry in the
+#     named population array.
+###############################################
+def _array_property(name):
+  def get(self):
+    return int(getattr(self.population, name)[self.index])
+  def set(self, value):
+    getattr(self.population, name)[self.index] = value
+  return property(get, set)
+
+###################################
+# IconView class
+#
+#   One fish of an IconPopulation, with the same attributes and methods as
+#     an Icon (x, y, direction, velocity, onScreen, setSlowdown, move, 
+#     show, ...).  It holds no state of its own, everything reads and 
+#     writes the arrays.
+#
+#   Its population is set, so Tank knows to move it with the rest of the
+#     population instead of calling move() on it.
+###################################
+class IconView(object):
+
+  def __init__(self, population, index):
+    self.population = population
+    self.index = index
+
+  x = _array_property("x")
+  y = _array_property("y")
+  x_size = _array_property("x_size")
+  y_size = _array_property("y_size")
+  direction = _array_property("direction")
+  slowdown = _array_property("slowdown")
+
+  @property
+  def velocity(self):
+    return float(self.population.velocity[self.index])
+
+  @velocity.setter
+  def velocity(self, value):
+    self.population.velocity[self.index] = value
+
+  @property
+  def travel(self):
+    return float(self.population.travel[self.index])
+
+  @property
+  def timeout(self):
+    return float(self.population.timeout[self.index])
+
+  @property
+  def timeoutStart(self):
+    return float(self.population.timeout_start[self.index])
+
+  @property
+  def onScreen(self):
+    return bool(self.population.on_screen[self.index])
+
+  @onScreen.setter
+  def onScreen(self, value):
+    self.population.on_screen[self.index] = value
+
+  @property
+  def filename(self):
+    return self.population.filenames[self.index]
+
+  @property
+  def sprite(self):
+    return self.population.sprites[self.index]
+
+  @property
+  def image(self):
+    return self.sprite.image
+
+  @property
+  def mask(self):
+    return self.sprite.mask
+
+  def setSlowdown(self, slowdown):
+    self.slowdown = slowdown
+    self.velocity = slowdown_velocity(slowdown)
+
+  def setVelocity(self, velocity):
+    self.velocity = velocity
+
+  def setDirection(self, direction):
+    self.direction = direction
+
+  def show(self, image):
+    sprite_image, sprite_mask = self.sprite.oriented(self.direction)
+    image.paste(sprite_image,(self.x,self.y),sprite_mask)
+
+  def move(self, dt=None):
+    self.population.step(dt, self.index)
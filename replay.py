@@ -0,0 +1,161 @@
+import struct
+
+import numpy
+from PIL import Image
+
+from scheduler import FrameScheduler
+
+# magic, width, height, frames per second, frame count
+HEADER = struct.Struct("<4sHHfI")
+MAGIC = b"FTRP"
+
+###################################
+# Recording class
+#
+#   A file of recorded tank frames, memory mapped.  After a small header
+#     (see HEADER) come count frames of width x height RGBX pixels, back to
+#     back, so frame n is at a fixed offset and can be handed to the
+#     display as a view of the mapping, with nothing read or copied.
+#
+#   pixels is the (count, height, width, 4) numpy memmap of the frames and
+#     images holds an RGBX image over each of them.
+#
+#   Needs numpy.
+###################################
+class Recording():
+
+  ############################################
+  # Init method
+  #   Opens an existing recording, mode "r" to play it or "r+" to write
+  #     into it (see create).
+  ###############################################
+  def __init__(self, filename, mode="r"):
+    with open(filename, "rb") as recording:
+      magic, width, height, fps, count = HEADER.unpack(recording.read(HEADER.size))
+    if magic != MAGIC:
+      raise ValueError("not a tank recording: " + str(filename))
+    self.filename = filename
+    self.size = (width, height)
+    self.fps = fps
+    self.count = count
+    self.pixels = numpy.memmap(filename, numpy.uint8, mode, HEADER.size, (count, height, width, 4))
+    self.images = [Image.frombuffer("RGBX", self.size, self.pixels[index], "raw", "RGBX", 0, 1)
+                   for index in range(count)]
+
+  ############################################
+  # create
+  #   Makes a new recording file with room for count frames, and opens it
+  #     for writing.
+  ###############################################
+  @classmethod
+  def create(cls, filename, width, height, fps, count):
+    with open(filename, "wb") as recording:
+      recording.write(HEADER.pack(MAGIC, width, height, fps, count))
+      recording.truncate(HEADER.size + count * height * width * 4)
+    return cls(filename, "r+")
+
+  ############################################
+  # close method
+  #   Writes out and unmaps the frames.  count cuts the recording down to
+  #     its first count frames (e.g. when recording was interrupted).
+  ###############################################
+  def close(self, count=None):
+    if self.pixels is None:
+      return
+    self.pixels.flush()
+    self.images = []
+    self.pixels = None
+    if count is not None and count != self.count:
+      width, height = self.size
+      with open(self.filename, "r+b") as recording:
+        recording.write(HEADER.pack(MAGIC, width, height, self.fps, count))
+        recording.truncate(HEADER.size + count * height * width * 4)
+      self.count = count
+
+############################################
+# record
+#   Runs tank for seconds at fps frames per second and saves every frame,
+#     without the date/time text (play draws that live), to filename.
+#   Icons move exactly 1/fps seconds each frame (see Tank.frame_time), so
+#     the recording plays back at the right speed however long each frame
+#     took to make, and frames are made as fast as they can be.  Fish
+#     waiting off screen wait in real seconds though, so realtime=True
+#     paces recording at fps to keep those waits the same length too.
+#   A compositor that can draw into any buffer (ArrayCompositor) draws
+#     straight into the file's mapping, others are copied in.  Returns the
+#     number of frames recorded.
+###############################################
+def record(tank, filename, seconds, fps=50, realtime=False):
+  count = int(round(seconds * fps))
+  recording = Recording.create(filename, tank.total_columns, tank.total_rows, fps, count)
+  scheduler = FrameScheduler(fps) if realtime else None
+  frame_time = tank.frame_time
+  tank.frame_time = 1.0 / fps
+  compositor = tank.compositor
+  retarget = hasattr(compositor, "retarget")
+  if retarget:
+    own = (compositor.pixels, compositor.frame)
+  box = (0, 0) + recording.size
+  recorded = 0
+  try:
+    for index in range(count):
+      image = recording.images[index]
+      if retarget:
+        compositor.retarget(recording.pixels[index], image)
+      frame = tank.render(text=False)
+      if frame is not image:
+        frame.load()
+        image.im.paste(frame.im, box)
+      recorded += 1
+      if tank.profiler is not None:
+        tank.profiler.stage("record")
+        tank.profiler.end_frame()
+      if scheduler is not None:
+        scheduler.wait()
+  finally:
+    tank.frame_time = frame_time
+    if retarget:
+      compositor.retarget(*own)
+      tank.screen = compositor.frame
+    recording.close(recorded)
+  return recorded
+
+############################################
+# play
+#   Shows a recording on tank's display, at the rate it was recorded,
+#     loops times over (forever if None).  Nothing is composited:  frames go
+#     to the display straight from the mapping, and only while there is
+#     text is each one copied into one scratch frame to draw the tank's
+#     live date/time text on top.  So the cost of a frame doesn't depend
+#     on how many icons were in the recorded tank.
+#   Raises ValueError for a recording with no frames (e.g. one interrupted
+#     before its first frame).
+#   The scheduler is kept as tank.scheduler so its stats can be read.
+###############################################
+def play(tank, filename, loops=None, policy="drop"):
+  recording = Recording(filename)
+  if recording.count == 0:
+    recording.close()
+    raise ValueError("no frames in recording: " + str(filename))
+  tank.scheduler = FrameScheduler(recording.fps, policy)
+  overlay = tank.overlay
+  scratch = Image.new("RGBX", recording.size)
+  box = (0, 0) + recording.size
+  loop = 0
+  try:
+    while loops is None or loop < loops:
+      for image in recording.images:
+        if tank.clock.tick():
+          overlay.update(tank.clock.strings("time", "day_of_week", "date"), tank.layout_text)
+        if overlay.layer is not None:
+          scratch.im.paste(image.im, box)
+          left, top = overlay.position
+          width, height = overlay.layer.size
+          scratch.im.paste(overlay.layer.im, (left, top, left + width, top + height), overlay.mask.im)
+          image = scratch
+        tank.output.show(image)
+        tank.scheduler.wait()
+      loop += 1
+  finally:
+    tank.output.close()
+    recording.close()
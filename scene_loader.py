@@ -0,0 +1,157 @@
+import sys
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from timeit import default_timer
+
+from sprite import CACHE_DIR, load_background, load_sprite, shared_sprite, sprite_key
+
+############################################
+# _timed
+#   Runs function(*args) and returns (result, seconds it took).  What the
+#     pool runs for each asset.
+###############################################
+def _timed(function, args):
+  start = default_timer()
+  result = function(*args)
+  return result, default_timer() - start
+
+###################################
+# SceneLoader class
+#
+#   Loads a tank's background and icon images all at once on a pool of
+#     worker threads, instead of one after another before the first frame.
+#     Decoding, resizing and masking are done inside PIL, which lets other
+#     threads run meanwhile, so on the Pi's four cores they overlap.
+#
+#   The scene is described first, then load() waits for every asset and
+#     sets up the tank:
+#       scene = SceneLoader(fish_tank, Icon)
+#       scene.set_background("images/tanks/coral_tank.jpg")
+#       scene.add_icon("images/icons/dory.jpg", (0,10), (150,255), (0,10), 28, 20, 20)
+#       ...
+#       dory, ... = scene.load()
+#   Icons are made (in the order they were added) and added to the tank
+#     in that same order, so the back to front order is the same as calling
+#     add_icon directly.
+#
+#   Icons with the same file, size and ranges are only loaded once, and
+#     share their sprite as usual (see shared_sprite).  How long each asset
+#     took is kept in timings and written to log, slowest first.
+###################################
+class SceneLoader():
+
+  ############################################
+  # Init method
+  #   tank is the Tank the scene is for, and icon_class makes its icons
+  #     (Icon, with the same arguments, plus sprite).
+  #   workers is how many threads load at once (None for one per core).
+  #   log is where the load times go, None to keep quiet.
+  ###############################################
+  def __init__(self, tank, icon_class, workers=None, log=sys.stderr, cache_dir=CACHE_DIR):
+    self.tank = tank
+    self.icon_class = icon_class
+    self.workers = workers
+    self.log = log
+    self.cache_dir = cache_dir
+    self.background = None
+    self.icons = []
+    self.timings = []
+    self.elapsed = 0.0
+
+  ############################################
+  # set_background method
+  ###############################################
+  def set_background(self, filename):
+    self.background = filename
+
+  ############################################
+  # add_icon method
+  #   Takes Icon's arguments, less the tank size.
+  ###############################################
+  def add_icon(self, filename, rtr, gtr, btr, x_size, y_size, timeout_seconds):
+    self.icons.append(SceneIcon(filename, rtr, gtr, btr, x_size, y_size, timeout_seconds))
+
+  ############################################
+  # load method
+  #   Loads everything on the pool, then sets the tank's background and
+  #     adds the icons to it.  Returns the icons in the order they were
+  #     added.
+  ###############################################
+  def load(self):
+    tank = self.tank
+    size = (tank.total_columns, tank.total_rows)
+    start = default_timer()
+
+    # one job per distinct asset, all started before waiting for any
+    pool = ThreadPool(self.workers)
+    try:
+      background = None
+      if self.background is not None:
+        background = pool.apply_async(_timed, (load_background, (self.background, size, self.cache_dir)))
+      sprites = {}
+      for icon in self.icons:
+        key = icon.key()
+        if key not in sprites:
+          args = (icon.filename, (icon.x_size, icon.y_size), icon.rtr, icon.gtr, icon.btr, self.cache_dir)
+          sprites[key] = (icon.filename, pool.apply_async(_timed, (load_sprite, args)))
+
+      self.timings = []
+      if background is not None:
+        image, seconds = background.get()
+        self.timings.append((self.background, seconds))
+        tank.set_background(self.background, image)
+      loaded = {}
+      for key, (filename, job) in sprites.items():
+        pair, seconds = job.get()
+        self.timings.append(("%s %dx%d" % (filename, key[1][0], key[1][1]), seconds))
+        loaded[key] = pair
+    finally:
+      pool.close()
+      pool.join()
+    self.elapsed = default_timer() - start
+
+    icons = []
+    for icon in self.icons:
+      sprite = shared_sprite(icon.filename, (icon.x_size, icon.y_size), icon.rtr, icon.gtr, icon.btr,
+                             self.cache_dir, loaded[icon.key()])
+      made = self.icon_class(icon.filename, icon.rtr, icon.gtr, icon.btr, icon.x_size, icon.y_size,
+                             icon.timeout_seconds, tank.total_columns, tank.total_rows, sprite=sprite)
+      tank.add_icon(made)
+      icons.append(made)
+
+    if self.log is not None:
+      self.log.write(self.report() + "\n\n")
+      self.log.flush()
+    return icons
+
+  ############################################
+  # report method
+  #   Returns the load times as a printable table, slowest first.  The
+  #     times overlap, so the total is usually less than their sum.
+  ###############################################
+  def report(self):
+    lines = ["%-40s %8s" % ("asset", "ms")]
+    for name, seconds in sorted(self.timings, key=lambda timing: -timing[1]):
+      lines.append("%-40s %8.1f" % (name[-40:], 1000.0 * seconds))
+    workers = self.workers or cpu_count()
+    lines.append("%-40s %8.1f" % ("total (%d workers)" % workers, 1000.0 * self.elapsed))
+    return "\n".join(lines)
+
+###################################
+# SceneIcon class
+#
+#   An icon waiting to be loaded:  the arguments for its Icon.
+###################################
+class SceneIcon():
+
+  def __init__(self, filename, rtr, gtr, btr, x_size, y_size, timeout_seconds):
+    self.filename = filename
+    self.rtr = rtr
+    self.gtr = gtr
+    self.btr = btr
+    self.x_size = x_size
+    self.y_size = y_size
+    self.timeout_seconds = timeout_seconds
+
+  def key(self):
+    return sprite_key(self.filename, (self.x_size, self.y_size), self.rtr, self.gtr, self.btr)
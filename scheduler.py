@@ -0,0 +1,166 @@
+import ctypes
+import ctypes.util
+import time
+from timeit import default_timer
+
+############################################
+# _clock_gettime_monotonic
+#   Python 2 has no time.monotonic, so on Linux (the Pi) we ask for 
+#     CLOCK_MONOTONIC ourselves.  Returns the clock function, or None if 
+#     there's no clock_gettime to be had.
+###############################################
+def _clock_gettime_monotonic():
+  class timespec(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+  CLOCK_MONOTONIC = 1
+
+  for name in ("rt", "c"):
+    library = ctypes.util.find_library(name)
+    if library is None:
+      continue
+    try:
+      clock_gettime = ctypes.CDLL(library, use_errno=True).clock_gettime
+    except (OSError, AttributeError):
+      continue
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+
+    def monotonic():
+      now = timespec()
+      if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(now)) != 0:
+        raise OSError(ctypes.get_errno(), "clock_gettime failed")
+      return now.tv_sec + now.tv_nsec * 1e-9
+    return monotonic
+  return None
+
+############################################
+# monotonic
+#   Seconds from a clock that never jumps, unlike time.time, which steps
+#     backwards or forwards when a Pi without a clock chip syncs with NTP.
+#     Use it for anything that times frames or waits.
+###############################################
+try:
+  from time import monotonic
+except ImportError:
+  monotonic = _clock_gettime_monotonic() or default_timer
+
+
+###################################
+# FrameScheduler class
+#
+#   Keeps the tank running at a steady frame rate.  Instead of sleeping a
+#     fixed time after each frame (which makes the real frame period render
+#     time + sleep time), we keep a deadline for every frame and only sleep
+#     for whatever is left of it.
+#
+#   When a frame finishes after its deadline the miss is counted and the
+#     policy decides what happens next:
+#       "drop"    - skip the frame slots we ran past and line back up with
+#                   the original frame grid (steady pace, fewer frames)
+#       "catchup" - keep the missed deadlines and run the next frames back
+#                   to back until we are on time again (all frames, uneven
+#                   pace).  If we fall more than max_lag seconds behind we
+#                   give up and start a fresh grid.
+###################################
+class FrameScheduler():
+
+  ############################################
+  # Init method
+  #   fps is the target frames per second
+  #   policy is "drop" or "catchup", see above
+  #   max_lag is how far behind (in seconds) "catchup" will try to recover
+  #   timer and sleep can be swapped out for testing
+  ###############################################
+  def __init__(self, fps, policy="drop", max_lag=1.0, timer=monotonic, sleep=time.sleep):
+    if policy not in ("drop", "catchup"):
+      raise ValueError("unknown frame policy: " + str(policy))
+    self.policy = policy
+    self.max_lag = max_lag
+    self.timer = timer
+    self.sleep = sleep
+    self.set_fps(fps)
+    self.reset()
+
+  ############################################
+  # set_fps method
+  #   Changes the target rate, starting from the next frame.
+  ###############################################
+  def set_fps(self, fps):
+    self.fps = fps
+    self.period = 1.0 / fps
+
+  ############################################
+  # reset method
+  #   Clears our counters and starts a new frame grid on the next wait.
+  ###############################################
+  def reset(self):
+    self.deadline = None
+    self.started = None
+    self.frames = 0
+    self.missed = 0
+    self.dropped = 0
+    self.overrun_total = 0.0
+    self.worst_overrun = 0.0
+    self.last_overrun = 0.0
+
+  ############################################
+  # wait method
+  #   Call once after each frame.  Sleeps until the next frame's deadline
+  #     and returns how late this frame was (0 if it was on time).
+  ###############################################
+  def wait(self):
+    now = self.timer()
+    if self.deadline is None:
+      # the first frame has nothing to be late for
+      self.started = now
+      self.deadline = now
+    self.frames += 1
+
+    late = now - self.deadline
+    if late < -2 * self.period:
+      # our deadline is further off than it can be, so the timer went
+      # backwards.  Start a fresh grid rather than sleeping it off.
+      self.deadline = now
+      late = 0.0
+    if late <= 0:
+      self.last_overrun = 0.0
+      self.sleep(-late)
+      self.deadline += self.period
+      return 0.0
+
+    self.missed += 1
+    self.last_overrun = late
+    self.overrun_total += late
+    self.worst_overrun = max(self.worst_overrun, late)
+
+    if self.policy == "drop" or late > self.max_lag:
+      # skip every slot we ran past and wait for the next one on the grid
+      skipped = int(late / self.period)
+      if self.policy == "drop":
+        self.dropped += skipped
+      self.deadline += (skipped + 1) * self.period
+      self.sleep(max(0.0, self.deadline - self.timer()))
+      self.deadline += self.period
+    else:
+      # no sleeping, the next frame is already due
+      self.deadline += self.period
+    return late
+
+  ############################################
+  # stats method
+  #   Returns a dictionary of our counters, including the real frame rate.
+  ###############################################
+  def stats(self):
+    fps = 0.0
+    if self.started is not None and self.frames > 1:
+      elapsed = self.timer() - self.started
+      if elapsed > 0:
+        fps = (self.frames - 1) / elapsed
+    return {
+      "target_fps": self.fps,
+      "fps": fps,
+      "frames": self.frames,
+      "missed": self.missed,
+      "dropped": self.dropped,
+      "overrun_total": self.overrun_total,
+      "worst_overrun": self.worst_overrun,
+    }
@@ -1,15 +1,15 @@
-from time import sleep
-import datetime
-from pytz import timezone
-
-
 import random
 
 ###################################
 # Graphics imports, constants and structures
 ###################################
-from rgbmatrix import RGBMatrix, RGBMatrixOptions
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
+from clock import Clock
+from display import display_args, make_display
+from scheduler import FrameScheduler, monotonic
+from fonts import registry
+from motion import advance
+from sprite import load_sprite, load_background
 
 # this is the size of ONE of our matrixes. 
 matrix_rows = 32
@@ -22,81 +22,59 @@ matrix_vertical = 3
 total_rows = matrix_rows * matrix_vertical
 total_columns = matrix_columns * matrix_horizontal
 
-options = RGBMatrixOptions()
-options.rows = matrix_rows 
-options.cols = matrix_columns 
-options.chain_length = matrix_horizontal
-options.parallel = matrix_vertical 
-#options.hardware_mapping = 'adafruit-hat-pwm'  # If you have an Adafruit HAT: 'adafruit-hat'
-#options.hardware_mapping = 'adafruit-hat'  # If you have an Adafruit HAT: 'adafruit-hat'
-options.hardware_mapping = 'regular' 
-
-options.gpio_slowdown = 2
+#pick where frames go from the command line, the LED panels by default.
+#(on the panels frames are double buffered and swapped in on vsync)
+display_name, display_options = display_args()
+output = make_display(display_name, matrix_rows, matrix_columns, matrix_horizontal, matrix_vertical, 
+                      gpio_slowdown = 2, **display_options)
 
-matrix = RGBMatrix(options = options)
+# formats our date/time text once a second in the chosen timezone
+clock = Clock("US/Mountain")
 
 ###################################
 # Main code 
 ###################################
 
 
-fnt = ImageFont.truetype("Arial_Bold.ttf",14)
-fnt2 = ImageFont.truetype("Arial_Bold.ttf",20)
-fnt3 = ImageFont.truetype("Arial_Bold.ttf",16)
+fnt = registry.get(14)
+fnt2 = registry.get(20)
+fnt3 = registry.get(16)
 
 
-background = Image.open("images/tanks/andr_small.jpeg")
-background.convert("RGBA")
-background = background.resize((total_columns,total_rows))
+background = load_background("images/tanks/andr_small.jpeg", (total_columns,total_rows))
 
 icon_size = 40
-icon_image = Image.open("images/icons/tie-fighter-01.jpg")
-icon_image = icon_image.convert("RGBA")
-icon_image = icon_image.resize((icon_size,icon_size))
+# load each image along with its transparency mask.
+# any pixel that's white is transparent (black) in the mask, everything 
+# else is fully opaque (white)
+# Note that further inspection of our image shows that the background isn't 
+# a full 255,255,255...it's 242,242,242.
+icon_image, mask = load_sprite("images/icons/tie-fighter-01.jpg", (icon_size,icon_size), (242,242), (242,242), (242,242))
 icon_x = total_columns
 icon_y = random.randint(0,total_rows-icon_size)
 
 falcon_imageWidth = 102
 falcon_imageHeight = 50
-falcon_image = Image.open("images/icons/Millennium-Falcon.png")
-falcon_image = falcon_image.convert("RGBA")
-falcon_image = falcon_image.resize((falcon_imageWidth,falcon_imageHeight))
+falcon_image, falcon_mask = load_sprite("images/icons/Millennium-Falcon.png", (falcon_imageWidth,falcon_imageHeight), (120,255), (0,60), (0,60))
 falcon_x = - falcon_imageWidth
 falcon_y = random.randint(0,total_rows - falcon_imageHeight)
 
-# now that we have our image, we want to make a transparency mask.
-# start by looking at each pixel, and if it's white, make the mask
-# transparent (black).  Otherwise, make it fully opaque (white)
-# Note that further inspection of our image shows that the background isn't 
-# a full 255,255,255...it's 242,242,242.
-mask = Image.new("L", (icon_size,icon_size))
-icon_data = icon_image.getdata()
-mask_data = []
-for item in icon_data:
-  print item
-  if item[0] == 242 and item[1] == 242 and item[2] == 242:
-    mask_data.append(0)
-    print "transparent"
-  else:
-    mask_data.append(255)
-    print "opaque"
-mask.putdata(mask_data)
-
-falcon_mask = Image.new("L", (falcon_imageWidth,falcon_imageHeight))
-falcon_data = falcon_image.getdata()
-falcon_mask_data = []
-for item in falcon_data:
-  print item
-  if item[0] >= 120 and item[1] <= 60 and item[2] <= 60:
-    falcon_mask_data.append(0)
-    print "transparent"
-  else:
-    falcon_mask_data.append(255)
-    print "opaque"
-falcon_mask.putdata(falcon_mask_data)
 
 screen = Image.new("RGBA",(total_columns,total_rows))
 
+# speeds are in pixels per second, so they don't depend on the frame rate.
+# the travel values keep the part of a pixel covered so far.
+icon_speed = 10.0
+icon_travel = 0.0
+falcon_speed = 20.0
+falcon_travel = 0.0
+
+# keeps the loop at 10 frames per second however long a frame takes to draw
+scheduler = FrameScheduler(10)
+# when we last moved things, each frame moves them by the time since then
+# (at most a quarter of a second, so a long stall doesn't send them flying)
+lastMove = monotonic()
+
 try:
   print("Press CTRL-C to stop")
   while True:
@@ -114,16 +92,13 @@ try:
     screen_draw = ImageDraw.Draw(screen)
 
     # draw text on top
-    currentDT = datetime.datetime.now(timezone('UTC'))
-    currentDT_TZadjusted = currentDT.astimezone(timezone('US/Mountain'))
-    time_string = currentDT_TZadjusted.strftime("%I:%M:%S %p")
-    day_of_week = currentDT_TZadjusted.strftime("%A")
-    date_string = currentDT_TZadjusted.strftime("%B %d, %Y")
+    clock.tick()
+    time_string, day_of_week, date_string = clock.strings("time", "day_of_week", "date")
 
     # do some math to center our time string
-    time_size = fnt.getsize(time_string)
-    day_of_week_size = fnt2.getsize(day_of_week)
-    date_string_size = fnt3.getsize(date_string)
+    time_size = registry.getsize(time_string, 14)
+    day_of_week_size = registry.getsize(day_of_week, 20)
+    date_string_size = registry.getsize(date_string, 16)
 
     time_x = (total_columns - time_size[0])/2
     time_y = (total_rows - time_size[1])/2 
@@ -139,21 +114,28 @@ try:
     screen_draw.text((time_x,time_y),time_string, fill = (219,4,216), font = fnt)
     screen_draw.text((day_x, day_y),day_of_week, fill = (255,255,255), font = fnt2)
     screen_draw.text((date_x, date_y),date_string, fill = (245,245,66), font = fnt3)
-    matrix.SetImage(screen,0,0)
+    output.show(screen)
+
+    # how long since we last moved
+    now = monotonic()
+    elapsed = min(now - lastMove, 0.25)
+    lastMove = now
 
     # update our location for next time
-    icon_x = icon_x - 1
+    pixels, icon_travel = advance(icon_travel, icon_speed, elapsed)
+    icon_x = icon_x - pixels
     if (icon_x < (0 - icon_size)):
       icon_x = total_columns
       icon_y = random.randint(0,total_rows-icon_size)
 
 
-    falcon_x = falcon_x + 2
+    pixels, falcon_travel = advance(falcon_travel, falcon_speed, elapsed)
+    falcon_x = falcon_x + pixels
     if (falcon_x > total_columns):
       falcon_x = -3 * total_columns
       falcon_y = random.randint(0,total_rows - falcon_imageHeight)
 
-    sleep(.1)
+    scheduler.wait()
 
 except KeyboardInterrupt:
   exit(0)
@@ -0,0 +1,318 @@
+import hashlib
+import os
+import time
+
+import PIL
+from PIL import Image, ImageChops
+
+###################################
+# sprite helpers
+#
+#   Shared image helpers for the tank scripts.
+#
+#   make_mask builds the transparency mask for an icon in one pass over the
+#     whole image instead of walking it pixel by pixel.
+#
+#   The Sprite class holds an image with its mask, plus any flipped or 
+#     scaled copies of the pair, built once and then reused every frame.
+###################################
+
+############################################
+# _range_table
+#   Builds a 256 entry lookup table that maps every value in the inclusive
+#     range (low, high) to 255 and everything else to 0.
+###############################################
+def _range_table(value_range):
+  low, high = value_range
+  return [255 if low <= value <= high else 0 for value in range(256)]
+
+############################################
+# make_mask
+#   rtr, gtr, and btr are the transparency ranges for red, green, and blue
+#      pixels in our image, represented as a tuple.  Any pixel in that range
+#      (inclusive) will be marked as transparent (black), everything else is
+#      fully opaque (white).
+#   Returns an "L" image the same size as the passed image.
+###############################################
+def make_mask(image, rtr, gtr, btr):
+  if image.mode not in ("RGB", "RGBA"):
+    image = image.convert("RGB")
+  bands = image.split()[:3]
+
+  # each band becomes 255 where it is inside its range, then the three
+  # bands are and-ed together with multiply (255 * 255 / 255 == 255).
+  keyed = None
+  for band, value_range in zip(bands, (rtr, gtr, btr)):
+    in_range = band.point(_range_table(value_range))
+    if keyed is None:
+      keyed = in_range
+    else:
+      keyed = ImageChops.multiply(keyed, in_range)
+
+  # pixels inside all three ranges are transparent, so flip the result
+  return ImageChops.invert(keyed)
+
+###################################
+# sprite variants
+#
+#   A variant is a transform applied to both the image and the mask of a 
+#     sprite, such as a flip.  Variants are looked up by name in VARIANTS; 
+#     extra arguments (like the size for "scale") are passed through to the
+#     transform and become part of the cache key.
+###################################
+VARIANTS = {
+  "flip_lr": lambda image: image.transpose(Image.FLIP_LEFT_RIGHT),
+  "flip_tb": lambda image: image.transpose(Image.FLIP_TOP_BOTTOM),
+  "scale": lambda image, size: image.resize(tuple(size), Image.NEAREST),
+}
+
+############################################
+# register_variant
+#   Adds a new named transform.  transform takes an image (plus any extra
+#     arguments given to Sprite.variant) and returns a new image.
+###############################################
+def register_variant(name, transform):
+  VARIANTS[name] = transform
+
+###################################
+# Sprite class
+#
+#   An image and its transparency mask, along with a cache of variants.
+#
+#   variant builds the requested copy the first time it's asked for and 
+#     hands back the same pair after that, so nothing is allocated per frame.
+###################################
+class Sprite():
+
+  ############################################
+  # Init method 
+  #   image is the RGBA sprite and mask its "L" transparency mask
+  ###############################################
+  def __init__(self, image, mask):
+    self.image = image
+    self.mask = mask
+    self.variants = {}
+
+  ############################################
+  # variant method 
+  #   Returns (image, mask) for the named variant, building it on first use.
+  ###############################################
+  def variant(self, name, *args):
+    key = (name,) + args
+    pair = self.variants.get(key)
+    if pair is None:
+      transform = VARIANTS[name]
+      pair = (transform(self.image, *args), transform(self.mask, *args))
+      self.variants[key] = pair
+    return pair
+
+  ############################################
+  # oriented method 
+  #   Returns (image, mask) facing the given direction.  Our source images
+  #     face right, so 1 -> Right is the original and -1 -> Left is flipped.
+  ###############################################
+  def oriented(self, direction):
+    if direction == 1:
+      return self.image, self.mask
+    return self.variant("flip_lr")
+
+###################################
+# sprite cache
+#
+#   Decoding, resizing and masking every icon on each start is slow on the 
+#     Pi, so the finished images are kept in CACHE_DIR as raw pixel data.
+#
+#   Each cache file is named after a hash of the source file contents, the
+#     target size and the transparency ranges, along with the Pillow version
+#     and resize filter, so editing an image, changing an Icon's parameters
+#     or upgrading Pillow simply misses the cache.  The file holds a short
+#     text header followed by the raw bytes of each image, which load
+#     straight back with Image.frombytes.
+#
+#   Reading an entry marks it as used, and entries that go unused for
+#     CACHE_MAX_AGE seconds are deleted the next time anything is written 
+#     to the cache, so stale ones don't pile up.
+###################################
+
+CACHE_DIR = "cache/sprites"
+CACHE_MAGIC = "TANKSPRITE1"
+CACHE_MAX_AGE = 30 * 24 * 60 * 60
+# sprites and backgrounds are always resized with this filter (Pillow's 
+# own default changed in 7.0)
+RESAMPLE = Image.NEAREST
+
+############################################
+# _cache_key
+#   Hashes the source file contents together with everything else that 
+#     changes the finished images.
+###############################################
+def _cache_key(filename, *params):
+  digest = hashlib.sha1()
+  with open(filename, "rb") as source:
+    digest.update(source.read())
+  digest.update(repr(params + (RESAMPLE, getattr(PIL, "__version__", ""))).encode("ascii"))
+  return digest.hexdigest()
+
+############################################
+# _read_cache
+#   Returns the list of images stored under key, or None if there is no 
+#     usable cache file.
+###############################################
+def _read_cache(cache_dir, key):
+  if cache_dir is None:
+    return None
+  path = os.path.join(cache_dir, key + ".raw")
+  try:
+    with open(path, "rb") as cached:
+      data = cached.read()
+  except (IOError, OSError):
+    return None
+
+  try:
+    # only the header is split into lines, not the pixels after it
+    first, rest = data.split(b"\n", 1)
+    magic, count = first.decode("ascii").split()
+    if magic != CACHE_MAGIC:
+      return None
+    lines = rest.split(b"\n", int(count))
+    if len(lines) != int(count) + 1:
+      return None
+    pixels = lines[-1]
+
+    images = []
+    offset = 0
+    for line in lines[:-1]:
+      mode, width, height = line.decode("ascii").split()
+      size = (int(width), int(height))
+      length = size[0] * size[1] * len(mode)
+      images.append(Image.frombytes(mode, size, pixels[offset:offset + length]))
+      offset += length
+  except ValueError:
+    # a truncated or foreign file, treat it as a miss and rebuild it
+    return None
+
+  # mark it as used, so prune_cache keeps it
+  try:
+    os.utime(path, None)
+  except (IOError, OSError):
+    pass
+  return images
+
+############################################
+# prune_cache
+#   Deletes cache entries that haven't been used (read or written) for 
+#     max_age seconds, e.g. for images that were edited or Icons whose 
+#     parameters changed.  Done once per cache directory per run, the first
+#     time something is written to it.
+###############################################
+_pruned = set()
+
+def prune_cache(cache_dir, max_age=CACHE_MAX_AGE):
+  _pruned.add(cache_dir)
+  oldest = time.time() - max_age
+  try:
+    names = os.listdir(cache_dir)
+  except (IOError, OSError):
+    return
+  for name in names:
+    if not name.endswith((".raw", ".tmp")):
+      continue
+    path = os.path.join(cache_dir, name)
+    try:
+      if os.path.getmtime(path) < oldest:
+        os.remove(path)
+    except (IOError, OSError):
+      pass
+
+############################################
+# _write_cache
+#   Stores the images under key.  The file is written to a temporary name 
+#     first so a reboot mid-write can't leave a half written entry behind.
+#   A read-only or full disk just means we don't cache.
+###############################################
+def _write_cache(cache_dir, key, images):
+  if cache_dir is None:
+    return
+  header = [CACHE_MAGIC + " " + str(len(images))]
+  for image in images:
+    header.append("%s %d %d" % (image.mode, image.size[0], image.size[1]))
+  path = os.path.join(cache_dir, key + ".raw")
+  temp_path = path + ".tmp"
+  try:
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+    with open(temp_path, "wb") as cached:
+      cached.write(("\n".join(header) + "\n").encode("ascii"))
+      for image in images:
+        cached.write(image.tobytes())
+    os.rename(temp_path, path)
+  except (IOError, OSError):
+    pass
+  if cache_dir not in _pruned:
+    prune_cache(cache_dir)
+
+############################################
+# load_sprite
+#   Opens filename, converts it to RGBA, resizes it to size and builds its
+#     transparency mask (see make_mask).  Returns (image, mask), using the 
+#     cached copy when one exists.
+#   Pass cache_dir=None to skip the cache.
+###############################################
+def load_sprite(filename, size, rtr, gtr, btr, cache_dir=CACHE_DIR):
+  key = _cache_key(filename, "sprite", tuple(size), tuple(rtr), tuple(gtr), tuple(btr))
+  cached = _read_cache(cache_dir, key)
+  if cached is not None:
+    return cached[0], cached[1]
+
+  image = Image.open(filename)
+  image = image.convert("RGBA")
+  image = image.resize(tuple(size), RESAMPLE)
+  mask = make_mask(image, rtr, gtr, btr)
+  _write_cache(cache_dir, key, [image, mask])
+  return image, mask
+
+############################################
+# load_background
+#   Opens filename and resizes it to size, using the cached copy when one
+#     exists.  Palette images are stored as RGB.
+###############################################
+def load_background(filename, size, cache_dir=CACHE_DIR):
+  key = _cache_key(filename, "background", tuple(size))
+  cached = _read_cache(cache_dir, key)
+  if cached is not None:
+    return cached[0]
+
+  image = Image.open(filename)
+  if image.mode not in ("RGB", "RGBA", "L"):
+    image = image.convert("RGB")
+  image = image.resize(tuple(size), RESAMPLE)
+  _write_cache(cache_dir, key, [image])
+  return image
+
+############################################
+# sprite_key
+#   What shared sprites are filed under:  the file, size and transparency
+#     ranges.
+###############################################
+def sprite_key(filename, size, rtr, gtr, btr):
+  return (filename, tuple(size), tuple(rtr), tuple(gtr), tuple(btr))
+
+############################################
+# shared_sprite
+#   Returns the Sprite for a loaded icon, shared by every icon that asks for
+#     the same file, size and transparency ranges, so they use one copy of
+#     the images (and of any flipped or scaled variants) between them.
+#   loaded is an (image, mask) pair from load_sprite that has already been
+#     loaded elsewhere (see scene_loader.py), used if the sprite is new.
+###############################################
+_shared_sprites = {}
+
+def shared_sprite(filename, size, rtr, gtr, btr, cache_dir=CACHE_DIR, loaded=None):
+  key = sprite_key(filename, size, rtr, gtr, btr)
+  sprite = _shared_sprites.get(key)
+  if sprite is None:
+    if loaded is None:
+      loaded = load_sprite(filename, size, rtr, gtr, btr, cache_dir)
+    sprite = Sprite(*loaded)
+    _shared_sprites[key] = sprite
+  return sprite
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from bench_tank import check_allocations
+from fonts import DEFAULT_FACE
+
+############################################
+# Steady frames allocate no images
+#   Runs bench_tank.py's allocation check on a small tank for every 
+#     compositor that promises not to make images per frame.
+###############################################
+@pytest.mark.parametrize("compositor", ["full", "array", "tiled"])
+def test_steady_frames_allocate_no_images(compositor, monkeypatch):
+  if compositor == "array":
+    pytest.importorskip("numpy")
+  from PIL import ImageFont
+  try:
+    ImageFont.truetype(DEFAULT_FACE, 10)
+  except IOError:
+    pytest.skip("needs the %s font" % DEFAULT_FACE)
+
+  # the scene uses paths relative to the repo
+  monkeypatch.chdir(REPO)
+  scenario = {"icons": 16, "num_horiz": 5, "num_vert": 3, "scale": 1.0, "compositor": compositor}
+  checked, offenders = check_allocations(scenario, frames=100, warmup=20, seed=1234)
+  assert checked > 0
+  assert offenders == []